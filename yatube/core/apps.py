@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+
+        from .auth import forget_user
+        from .sqlite import configure_connection
+
+        connection_created.connect(configure_connection)
+        for signal in (post_save, post_delete):
+            signal.connect(forget_user, sender=settings.AUTH_USER_MODEL)
@@ -0,0 +1,49 @@
+"""Бэкенд аутентификации с пользователем из кэша.
+
+``AuthenticationMiddleware`` на каждом запросе достаёт пользователя по id
+из сессии. ``CachedModelBackend`` хранит в кэше значения полей
+пользователя и собирает из них объект без запроса к базе. В записи есть
+и хэш пароля: по нему Django сверяет хэш сессии, так что после смены
+пароля старые сессии перестают действовать. Запись сбрасывается при
+каждом сохранении и удалении пользователя (смена пароля, вход с
+обновлением ``last_login``, правка в админке); ``QuerySet.update`` по
+пользователям сигналов не шлёт и требует ``forget_user`` вручную.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from yatube.settings import AUTH_USER_CACHE_TIMEOUT
+
+
+def _key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def forget_user(sender, instance, **kwargs):
+    cache.delete(_key(instance.pk))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        model = get_user_model()
+        names = _fields(model)
+        values = cache.get(_key(user_id))
+        if values is None or len(values) != len(names):
+            try:
+                user = model._default_manager.get(pk=user_id)
+            except model.DoesNotExist:
+                return None
+            cache.set(
+                _key(user_id),
+                [getattr(user, name) for name in names],
+                AUTH_USER_CACHE_TIMEOUT,
+            )
+        else:
+            user = model.from_db(DEFAULT_DB_ALIAS, names, values)
+        return user if self.user_can_authenticate(user) else None
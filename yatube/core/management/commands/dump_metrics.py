@@ -0,0 +1,48 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from core.metrics import parse, summary
+from yatube.settings import METRICS_TOKEN
+
+
+class Command(BaseCommand):
+    help = (
+        'Читает /metrics/ работающего сервера (гистограммы живут в памяти '
+        'его процесса) и печатает сводку по view: число ответов, среднее '
+        'и p95 времени, запросы к базе, время рендера и попадания в кэш.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='http://127.0.0.1:8000/metrics/',
+            help='адрес страницы метрик',
+        )
+        parser.add_argument(
+            '--raw', action='store_true',
+            help='вывести метрики как есть, в формате Prometheus',
+        )
+
+    def handle(self, *args, url, raw, **options):
+        try:
+            response = requests.get(
+                url, timeout=10,
+                headers={'Authorization': f'Bearer {METRICS_TOKEN}'},
+            )
+            response.raise_for_status()
+        except requests.RequestException as error:
+            raise CommandError(f'Не удалось прочитать {url}: {error}')
+        if raw:
+            self.stdout.write(response.text, ending='')
+            return
+        rows, overhead = summary(parse(response.text))
+        for view, row in rows.items():
+            cache = row['cache_hits']
+            self.stdout.write(
+                f'{view:<28} ответов {row["requests"]:>6}, '
+                f'среднее {row["avg_ms"]:.1f} мс, '
+                f'p95 ≤ {row["p95_ms"]:.0f} мс, '
+                f'запросов {row["queries"]:.1f} ({row["db_ms"]:.1f} мс), '
+                f'рендер {row["template_ms"]:.1f} мс, '
+                f'кэш {"—" if cache is None else f"{cache:.0%}"}'
+            )
+        self.stdout.write(f'Накладные расходы сборщика: {overhead:.2%}')
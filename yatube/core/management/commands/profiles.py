@@ -0,0 +1,88 @@
+import os
+import pstats
+from collections import Counter
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Профили медленных запросов: list — сохранённые профили, '
+        'summary — самые горячие функции по всем профилям, token — '
+        'подписанный токен для заголовка X-Profile.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action', choices=('list', 'summary', 'token'),
+        )
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help='сколько функций показать в summary',
+        )
+        parser.add_argument(
+            '--view', help='учитывать только профили этого view, '
+                           'например posts:profile',
+        )
+
+    def handle(self, *args, action, top, view, **options):
+        if action == 'token':
+            self.stdout.write(profiling.make_token())
+            return
+        paths = profiling.profiles()
+        if view:
+            name = profiling.NAME_RE.sub('-', view)
+            paths = [
+                path for path in paths
+                if f'-{name}-' in os.path.basename(path)
+            ]
+        if not paths:
+            raise CommandError('Профилей нет')
+        if action == 'list':
+            for path in paths:
+                self.stdout.write(os.path.basename(path))
+            return
+        self.summarize_stacks(
+            [path for path in paths
+             if path.endswith(profiling.STACKS_SUFFIX)], top
+        )
+        self.summarize_pstats(
+            [path for path in paths
+             if path.endswith(profiling.PSTATS_SUFFIX)], top
+        )
+
+    def summarize_stacks(self, paths, top):
+        if not paths:
+            return
+        own = Counter()
+        total = Counter()
+        samples = 0
+        for path in paths:
+            for stack, count in profiling.read_stacks(path).items():
+                frames = stack.split(';')
+                samples += count
+                own[frames[-1]] += count
+                # Рекурсивная функция считается в стеке один раз
+                for frame in set(frames):
+                    total[frame] += count
+        self.stdout.write(
+            f'Снимки стеков: профилей {len(paths)}, снимков {samples}'
+        )
+        self.stdout.write(f'{"своё":>7} {"всего":>7}  функция')
+        for frame, count in own.most_common(top):
+            self.stdout.write(
+                f'{count / samples:>7.1%} {total[frame] / samples:>7.1%}  '
+                f'{frame}'
+            )
+
+    def summarize_pstats(self, paths, top):
+        if not paths:
+            return
+        out = StringIO()
+        stats = pstats.Stats(*paths, stream=out)
+        stats.sort_stats('tottime').print_stats(top)
+        self.stdout.write(f'cProfile: профилей {len(paths)}')
+        self.stdout.write(out.getvalue())
@@ -0,0 +1,298 @@
+"""Метрики горячего пути: время ответа, запросы к базе, рендер и кэш.
+
+``MetricsMiddleware`` собирает по каждому запросу время ответа, число и
+время запросов к базе (через ``connection.execute_wrapper``), время
+рендера шаблонов (через бэкенд ``InstrumentedTemplates``) и попадания в
+кэш, о которых сообщают ``record_cache``. Значения копятся в
+гистограммах процесса с подписью ``view`` (имя маршрута) и отдаются в
+текстовом формате Prometheus на ``/metrics/``.
+
+Собственные накладные расходы сборщика считаются отдельно, в
+``yatube_metrics_overhead_seconds``: их можно сравнить с суммой
+``yatube_request_seconds``.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+HISTOGRAMS = {
+    'yatube_request_seconds': (
+        'Время ответа', SECONDS_BUCKETS,
+    ),
+    'yatube_db_queries': (
+        'Запросов к базе за ответ', COUNT_BUCKETS,
+    ),
+    'yatube_db_seconds': (
+        'Время запросов к базе за ответ', SECONDS_BUCKETS,
+    ),
+    'yatube_template_seconds': (
+        'Время рендера шаблонов за ответ', SECONDS_BUCKETS,
+    ),
+}
+UNRESOLVED_VIEW = '<unresolved>'
+SAMPLE_RE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+LABEL_RE = re.compile(r'(\w+)="([^"]*)"')
+
+_state = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Последняя ячейка — значения больше самой верхней границы
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.histograms = {}
+        self.requests = defaultdict(int)
+        self.cache = defaultdict(int)
+        self.overhead = 0.0
+
+    def reset(self):
+        with self.lock:
+            self._clear()
+
+    def observe(self, view, status, values, cache_counts, overhead):
+        with self.lock:
+            for name, value in values.items():
+                key = (name, view)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(HISTOGRAMS[name][1])
+                self.histograms[key].observe(value)
+            self.requests[(view, status)] += 1
+            for (cache_name, result), count in cache_counts.items():
+                self.cache[(view, cache_name, result)] += count
+            self.overhead += overhead
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        with self.lock:
+            lines = []
+            for name, (help_text, _) in HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}',
+                          f'# TYPE {name} histogram']
+                for (metric, view), histogram in sorted(
+                    self.histograms.items()
+                ):
+                    if metric != name:
+                        continue
+                    for bound, total in histogram.cumulative():
+                        lines.append(
+                            f'{name}_bucket{{view="{view}",le="{bound}"}} '
+                            f'{total}'
+                        )
+                    lines.append(
+                        f'{name}_sum{{view="{view}"}} {histogram.sum:.6f}'
+                    )
+                    lines.append(
+                        f'{name}_count{{view="{view}"}} {histogram.count}'
+                    )
+            lines += ['# HELP yatube_requests_total Ответов по кодам',
+                      '# TYPE yatube_requests_total counter']
+            for (view, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'yatube_requests_total{{view="{view}",'
+                    f'status="{status}"}} {count}'
+                )
+            lines += ['# HELP yatube_cache_total Обращений к кэшу',
+                      '# TYPE yatube_cache_total counter']
+            for (view, name, result), count in sorted(self.cache.items()):
+                lines.append(
+                    f'yatube_cache_total{{view="{view}",cache="{name}",'
+                    f'result="{result}"}} {count}'
+                )
+            lines += [
+                '# HELP yatube_metrics_overhead_seconds Время сборщика',
+                '# TYPE yatube_metrics_overhead_seconds counter',
+                f'yatube_metrics_overhead_seconds {self.overhead:.6f}',
+            ]
+            return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def parse(text):
+    """Разбирает вывод ``Registry.render``: [(имя, метки, значение)]."""
+    samples = []
+    for line in text.splitlines():
+        match = SAMPLE_RE.match(line)
+        if line.startswith('#') or match is None:
+            continue
+        name, labels, value = match.groups()
+        samples.append(
+            (name, dict(LABEL_RE.findall(labels or '')), float(value))
+        )
+    return samples
+
+
+def quantile(buckets, share):
+    """Верхняя граница ячейки гистограммы, где лежит квантиль ``share``.
+
+    ``buckets`` — накопленные счётчики ``[(граница, всего), ...]``.
+    """
+    total = buckets[-1][1] if buckets else 0
+    for bound, count in buckets:
+        if total and count >= share * total:
+            return bound
+    return None
+
+
+def summary(samples):
+    """Сводка по view из разобранных метрик и доля накладных расходов."""
+    sums = defaultdict(lambda: defaultdict(float))
+    buckets = defaultdict(list)
+    overhead = 0.0
+    for name, labels, value in samples:
+        view = labels.get('view')
+        if name == 'yatube_metrics_overhead_seconds':
+            overhead = value
+        elif name == 'yatube_request_seconds_bucket':
+            bound = float(labels['le'].replace('+Inf', 'inf'))
+            buckets[view].append((bound, value))
+        elif name == 'yatube_cache_total':
+            sums[view][labels['result']] += value
+        elif name.endswith(('_sum', '_count')):
+            sums[view][name] = value
+    rows = {}
+    for view, values in sorted(sums.items()):
+        count = values['yatube_request_seconds_count']
+        if not count:
+            continue
+        lookups = values['hit'] + values['miss']
+        rows[view] = {
+            'requests': int(count),
+            'avg_ms': values['yatube_request_seconds_sum'] / count * 1000,
+            'p95_ms': quantile(buckets[view], 0.95) * 1000,
+            'queries': values['yatube_db_queries_sum'] / count,
+            'db_ms': values['yatube_db_seconds_sum'] / count * 1000,
+            'template_ms': (
+                values['yatube_template_seconds_sum'] / count * 1000
+            ),
+            'cache_hits': values['hit'] / lookups if lookups else None,
+        }
+    total = sum(
+        values['yatube_request_seconds_sum'] for values in sums.values()
+    )
+    return rows, overhead / total if total else 0.0
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.rendering = False
+        self.cache = defaultdict(int)
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обёртка connection.execute_wrapper вокруг каждого запроса
+        began = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += perf_counter() - began
+            self.queries += 1
+
+
+def current():
+    return getattr(_state, 'stats', None)
+
+
+def record_cache(name, hits=0, misses=0):
+    """Учитывает обращения к кэшу ``name`` в метриках текущего ответа."""
+    stats = current()
+    if stats is None:
+        return
+    if hits:
+        stats.cache[(name, 'hit')] += hits
+    if misses:
+        stats.cache[(name, 'miss')] += misses
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        began = perf_counter()
+        stats = _state.stats = RequestStats()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                overhead = perf_counter() - began
+                response = self.get_response(request)
+                finished = perf_counter()
+        finally:
+            _state.stats = None
+        match = getattr(request, 'resolver_match', None)
+        registry.observe(
+            match.view_name if match else UNRESOLVED_VIEW,
+            response.status_code,
+            {
+                'yatube_request_seconds': finished - began,
+                'yatube_db_queries': stats.queries,
+                'yatube_db_seconds': stats.db_seconds,
+                'yatube_template_seconds': stats.template_seconds,
+            },
+            stats.cache,
+            overhead + perf_counter() - finished,
+        )
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = current()
+        # Вложенный рендер (карточка внутри ленты) уже учтён внешним
+        if stats is None or stats.rendering:
+            return super().render(context, request)
+        stats.rendering = True
+        began = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_seconds += perf_counter() - began
+            stats.rendering = False
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, замеряющий время рендера для метрик."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self
+        )
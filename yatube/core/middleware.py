@@ -0,0 +1,31 @@
+from yatube.settings import REPLICA_PIN_COOKIE, REPLICA_PIN_SECONDS
+
+from . import routers
+
+
+class PinPrimaryMiddleware:
+    """Читать свои записи: после записи пользователь несколько секунд
+    читает из основной базы, пока реплики догоняют.
+
+    Отметка хранится в cookie, а не в сессии: сессию саму нужно прочитать
+    из базы, и анонимный пользователь сессии может не иметь.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset()
+        if REPLICA_PIN_COOKIE in request.COOKIES:
+            routers.pin()
+        try:
+            response = self.get_response(request)
+            if routers.wrote():
+                response.set_cookie(
+                    REPLICA_PIN_COOKIE, '1',
+                    max_age=REPLICA_PIN_SECONDS, httponly=True,
+                    samesite='Lax',
+                )
+            return response
+        finally:
+            routers.reset()
@@ -0,0 +1,204 @@
+"""Профили медленных запросов.
+
+Два режима, оба включаются настройками:
+
+* ``PROFILE_SLOW_REQUESTS`` — фоновый поток раз в
+  ``PROFILE_SAMPLE_INTERVAL`` секунд снимает стеки потоков, которые
+  обрабатывают запросы. Если ответ занял дольше ``PROFILE_THRESHOLD``,
+  собранные стеки сохраняются в формате collapsed stacks (его понимают
+  flamegraph.pl и speedscope), иначе выбрасываются. Сам запрос при этом
+  не замедляется: профилировщик не подключается к интерпретатору.
+* Заголовок ``X-Profile`` с токеном из ``manage.py profiles token``
+  включает для одного запроса полный cProfile; результат сохраняется
+  в формате pstats независимо от времени ответа.
+
+В каталоге ``PROFILE_DIR`` хранятся последние ``PROFILE_KEEP`` профилей.
+"""
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.core import signing
+
+from yatube.settings import (
+    PROFILE_DIR, PROFILE_KEEP, PROFILE_SAMPLE_INTERVAL,
+    PROFILE_SLOW_REQUESTS, PROFILE_THRESHOLD, PROFILE_TOKEN_MAX_AGE,
+)
+
+HEADER = 'HTTP_X_PROFILE'
+TOKEN_SALT = 'core.profiling'
+STACKS_SUFFIX = '.stacks'
+PSTATS_SUFFIX = '.prof'
+NAME_RE = re.compile(r'[^\w.-]+')
+
+
+def make_token():
+    return signing.dumps('profile', salt=TOKEN_SALT)
+
+
+def valid_token(token):
+    try:
+        signing.loads(token, salt=TOKEN_SALT, max_age=PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def frame_name(code):
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f'{module}:{code.co_name}'
+
+
+class StackSampler:
+    """Снимает стеки отслеживаемых потоков из одного фонового потока."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.active = {}
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self._run, name='yatube-sampler', daemon=True
+            )
+            self.thread.start()
+
+    def start(self, thread_id):
+        with self.lock:
+            self.active[thread_id] = Counter()
+            self._ensure_thread()
+            self.wakeup.set()
+
+    def stop(self, thread_id):
+        with self.lock:
+            return self.active.pop(thread_id, Counter())
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self.lock:
+            for thread_id, stacks in self.active.items():
+                frame = frames.get(thread_id)
+                names = []
+                while frame is not None:
+                    names.append(frame_name(frame.f_code))
+                    frame = frame.f_back
+                if names:
+                    stacks[';'.join(reversed(names))] += 1
+            if not self.active:
+                self.wakeup.clear()
+
+    def _run(self):
+        while True:
+            # Пока нет отслеживаемых запросов, поток спит и не берёт GIL
+            self.wakeup.wait()
+            time.sleep(self.interval)
+            self.sample()
+
+
+sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+
+
+def profile_path(view, elapsed, suffix):
+    # Имя начинается с времени до микросекунд: по нему и сортируем
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+    return os.path.join(
+        PROFILE_DIR,
+        f'{stamp}.{int(now * 10 ** 6) % 10 ** 6:06d}-'
+        f'{NAME_RE.sub("-", view)}-{elapsed * 1000:.0f}ms{suffix}',
+    )
+
+
+def profiles():
+    """Файлы профилей, от новых к старым."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    paths = [
+        os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)
+        if name.endswith((STACKS_SUFFIX, PSTATS_SUFFIX))
+    ]
+    return sorted(paths, key=os.path.basename, reverse=True)
+
+
+def enforce_retention(keep=PROFILE_KEEP):
+    for path in profiles()[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def save_stacks(view, elapsed, stacks):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = profile_path(view, elapsed, STACKS_SUFFIX)
+    with open(path, 'w', encoding='utf-8') as out:
+        for stack, count in stacks.most_common():
+            out.write(f'{stack} {count}\n')
+    enforce_retention()
+    return path
+
+
+def save_pstats(view, elapsed, profiler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = profile_path(view, elapsed, PSTATS_SUFFIX)
+    profiler.dump_stats(path)
+    enforce_retention()
+    return path
+
+
+def read_stacks(path):
+    stacks = Counter()
+    with open(path, encoding='utf-8') as lines:
+        for line in lines:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get(HEADER)
+        if token and valid_token(token):
+            return self.profile(request)
+        if not PROFILE_SLOW_REQUESTS:
+            return self.get_response(request)
+        thread_id = threading.get_ident()
+        began = time.perf_counter()
+        sampler.start(thread_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop(thread_id)
+        elapsed = time.perf_counter() - began
+        if elapsed >= PROFILE_THRESHOLD and stacks:
+            save_stacks(view_name(request), elapsed, stacks)
+        return response
+
+    def profile(self, request):
+        profiler = cProfile.Profile()
+        began = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        save_pstats(
+            view_name(request), time.perf_counter() - began, profiler
+        )
+        return response
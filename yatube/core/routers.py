@@ -0,0 +1,71 @@
+"""Маршрутизация запросов между основной базой и репликами.
+
+Запись всегда идёт в ``default``, чтение — в случайную реплику из
+``DATABASE_REPLICAS``. Чтение уходит в основную базу, если:
+
+* в этом потоке уже была запись (запрос видит то, что сам записал);
+* поток «закреплён» за основной базой — так делает ``PinPrimaryMiddleware``
+  для пользователя, который писал несколько секунд назад, и фоновые задачи;
+* открыта транзакция: внутри неё реплика может не видеть свежих строк;
+* читается сессия: отставшая реплика разлогинила бы пользователя.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from yatube.settings import DATABASE_REPLICAS
+
+PRIMARY_APPS = {'sessions'}
+
+_state = threading.local()
+
+
+def reset():
+    _state.pinned = False
+    _state.wrote = False
+
+
+def wrote():
+    return getattr(_state, 'wrote', False)
+
+
+@contextmanager
+def use_primary():
+    """Все чтения внутри блока идут в основную базу."""
+    previous = getattr(_state, 'pinned', False)
+    _state.pinned = True
+    try:
+        yield
+    finally:
+        _state.pinned = previous
+
+
+def pin():
+    _state.pinned = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            not DATABASE_REPLICAS
+            or model._meta.app_label in PRIMARY_APPS
+            or getattr(_state, 'pinned', False)
+            or wrote()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В репликах те же данные, что и в основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплики получают вместе с данными из основной базы
+        return db == DEFAULT_DB_ALIAS
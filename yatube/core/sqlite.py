@@ -0,0 +1,36 @@
+"""Настройка каждого нового соединения с SQLite.
+
+PRAGMA берутся из ключа ``PRAGMAS`` описания базы в ``DATABASES``: так их
+можно задать отдельно для основной базы и реплик или выключить совсем.
+Выполняются они на «сыром» соединении sqlite3, мимо журнала запросов
+Django, и не попадают в подсчёт запросов страниц.
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+
+NAME_RE = re.compile(r'^[a-z_]+$')
+VALUE_RE = re.compile(r'^(-?\d+|[A-Za-z]+)$')
+
+
+def pragma_statements(pragmas):
+    statements = []
+    for name, value in pragmas.items():
+        # PRAGMA не принимает параметров запроса, поэтому значения
+        # подставляются в текст и проверяются заранее
+        if not NAME_RE.match(name) or not VALUE_RE.match(str(value)):
+            raise ImproperlyConfigured(
+                f'Недопустимая PRAGMA в настройках: {name} = {value!r}'
+            )
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if not pragmas:
+        return
+    for statement in pragma_statements(pragmas):
+        connection.connection.execute(statement)
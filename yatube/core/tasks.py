@@ -0,0 +1,62 @@
+"""Фоновые задачи в пуле потоков процесса.
+
+Задачи ставятся в очередь ``ThreadPoolExecutor`` после фиксации
+транзакции, чтобы воркер видел уже сохранённые данные. При
+``BACKGROUND_WORKERS = 0`` задачи выполняются сразу в текущем потоке,
+тоже на основной базе и с записью ошибки в лог.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connections, transaction
+
+from yatube.settings import BACKGROUND_WORKERS
+
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _executor_instance():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=BACKGROUND_WORKERS,
+                thread_name_prefix='yatube-task',
+            )
+        return _executor
+
+
+def _call(func, *args, **kwargs):
+    try:
+        # Задача запускается сразу после записи, реплика может отставать
+        with use_primary():
+            return func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', func)
+
+
+def _run(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return _call(func, *args, **kwargs)
+    finally:
+        # У каждого потока воркера своё соединение с базой
+        connections.close_all()
+
+
+def submit(func, *args, **kwargs):
+    if not BACKGROUND_WORKERS:
+        # В потоке запроса: его соединения не закрываем, но ошибка задачи
+        # так же уходит в лог, а не превращается в 500
+        return _call(func, *args, **kwargs)
+    return _executor_instance().submit(_run, func, *args, **kwargs)
+
+
+def submit_on_commit(func, *args, **kwargs):
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
@@ -1,5 +1,12 @@
+import hmac
+
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
+from yatube.settings import METRICS_TOKEN
+
+from .metrics import registry
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -9,3 +16,14 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    # Метрики раскрывают устройство сайта: отдаём только сборщику
+    expected = f'Bearer {METRICS_TOKEN}'.encode()
+    given = request.META.get('HTTP_AUTHORIZATION', '').encode()
+    if not METRICS_TOKEN or not hmac.compare_digest(given, expected):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,37 @@
+"""Прогрев кэширующего загрузчика шаблонов.
+
+С ``django.template.loaders.cached.Loader`` шаблон читается с диска и
+компилируется при первом запросе к нему, и первые посетители после
+перезапуска платят за разбор ``base.html``, шапки и карточек. Прогрев
+при старте (см. ``yatube/wsgi.py``) заранее компилирует все шаблоны из
+``DIRS``, то есть из каталога ``templates/`` проекта.
+"""
+import os
+
+from django.template import engines
+
+TEMPLATE_SUFFIXES = ('.html', '.txt')
+
+
+def template_names(directories):
+    names = set()
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith(TEMPLATE_SUFFIXES):
+                    path = os.path.relpath(
+                        os.path.join(root, filename), directory
+                    )
+                    names.add(path.replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_up_templates():
+    """Компилирует все шаблоны проекта; возвращает их имена."""
+    warmed = []
+    for backend in engines.all():
+        names = template_names(backend.engine.dirs)
+        for name in names:
+            backend.get_template(name)
+        warmed += names
+    return warmed
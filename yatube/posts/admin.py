@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Group, Post
 
 
@@ -16,9 +17,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице — полнотекстовый индекс
+        if not search_term:
+            return queryset, False
+        return search.backend().filter_queryset(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'title', 'description')
+    list_display = ('pk', 'title', 'description', 'posts_count',
+                    'last_post_at')
     search_fields = ('title',)
 
 
@@ -0,0 +1,131 @@
+"""JSON API только для чтения: ленты и пост.
+
+Ленты строятся теми же запросами и тем же паджинатором, что и HTML. До
+сериализации по строкам страницы считается ``ETag`` — хэш id, версий и
+числа комментариев постов (версия растёт при правке поста, смене имени
+автора или группы). Если клиент прислал совпадающий ``If-None-Match``,
+ответ 304 уходит без сериализации. ``Last-Modified`` не отдаётся: ни
+одна дата не сдвигается при удалении поста, новом комментарии или
+переименовании автора, и клиент с одним ``If-Modified-Since`` получал
+бы устаревший 304.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import (
+    get_conditional_response, patch_vary_headers, quote_etag,
+)
+
+from .counters import stats_for
+from .feed import feed_posts
+from .groups import group_by_slug
+from .models import Post, User
+from .serializers import author_json, page_json, post_json
+from .utils import paginator
+from .views import group_posts_of, index_posts, profile_posts_of
+
+
+def api_login_required(view):
+    """Как ``login_required``, но вместо редиректа на форму входа — 401."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Нужна авторизация'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def conditional_json(request, validators, build):
+    """Ответ JSON с ETag; ``build`` зовётся только при 200."""
+    etag = quote_etag(
+        hashlib.md5(repr(validators).encode()).hexdigest()
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(
+            json.dumps(build(), ensure_ascii=False, separators=(',', ':')),
+            content_type='application/json',
+        )
+    response['ETag'] = etag
+    return response
+
+
+def feed_response(request, page_obj, extra=None):
+    posts = list(page_obj)
+    position = (
+        (page_obj.next_cursor, page_obj.previous_cursor)
+        if getattr(page_obj, 'is_keyset', False)
+        else (page_obj.number, page_obj.paginator.count)
+    )
+    validators = (
+        extra, position,
+        [(post.id, post.version, post.comments_count) for post in posts],
+    )
+
+    def build():
+        data = page_json(page_obj, [post_json(post) for post in posts])
+        if extra:
+            data.update(extra)
+        return data
+
+    return conditional_json(request, validators, build)
+
+
+def index(request):
+    return feed_response(request, paginator(request, index_posts()))
+
+
+def group_posts(request, slug):
+    group = group_by_slug(slug)
+    return feed_response(
+        request,
+        paginator(request, group_posts_of(group), count=group.posts_count),
+        {'group': {
+            'slug': group.slug,
+            'title': group.title,
+            'description': group.description,
+            'posts_count': group.posts_count,
+        }},
+    )
+
+
+def profile(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = stats_for(author)
+    return feed_response(
+        request,
+        paginator(
+            request, profile_posts_of(author), count=stats.posts_count
+        ),
+        {'author': {
+            **author_json(author),
+            'posts_count': stats.posts_count,
+            'followers_count': stats.followers_count,
+            'following_count': stats.following_count,
+        }},
+    )
+
+
+@api_login_required
+def follow_index(request):
+    response = feed_response(
+        request, paginator(request, feed_posts(request.user))
+    )
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id
+    )
+    return conditional_json(
+        request,
+        (post.id, post.version, post.comments_count),
+        lambda: post_json(post),
+    )
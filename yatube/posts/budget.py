@@ -0,0 +1,240 @@
+"""Бюджеты запросов и замеры времени для всех страниц приложения posts.
+
+Используется командой ``manage.py route_budget`` и тестами: ``seed``
+наполняет базу правдоподобными данными, ``sample_routes`` подбирает
+аргументы для каждого именованного маршрута, ``run`` замеряет число
+запросов и p50/p95 времени ответа.
+"""
+import math
+import random
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from faker import Faker
+
+from . import counters, feed
+from .models import Comment, Follow, Group, Post, User
+
+# Сессия (cached_db) и пользователь (core.auth) читаются из кэша; в
+# бюджет заложен промах по пользователю на первом запросе клиента.
+# JSON API, которому пользователь не нужен, сессию не читает
+QUERY_BUDGETS = {
+    'posts:index': 3,
+    'posts:group_index': 3,
+    'posts:group_list': 3,
+    'posts:profile': 4,
+    'posts:post_detail': 3,
+    'posts:comments': 3,
+    'posts:search': 3,
+    'posts:post_create': 2,
+    'posts:post_edit': 4,
+    'posts:add_comment': 5,
+    'posts:follow_index': 3,
+    'posts:profile_follow': 11,
+    'posts:profile_unfollow': 11,
+    'posts:api_index': 2,
+    'posts:api_post': 1,
+    'posts:api_group': 2,
+    'posts:api_profile': 2,
+    'posts:api_follow': 3,
+}
+BATCH_SIZE = 500
+# Точки сохранения появляются только внутри тестовой транзакции
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+
+Route = namedtuple('Route', 'name args user method data')
+
+
+def seed(users=2000, posts=10000, comments=20000, follows=10000,
+         groups=20, seed=0):
+    """Наполняет базу массовыми вставками и пересчитывает производные."""
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+    User.objects.bulk_create(
+        (
+            User(
+                username=f'{fake.user_name()}{number}',
+                first_name=fake.first_name(),
+                last_name=fake.last_name(),
+                password='!',
+            )
+            for number in range(users)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Group.objects.bulk_create(
+        (
+            Group(
+                title=fake.sentence(nb_words=3)[:200],
+                slug=f'group-{number}',
+                description=fake.paragraph(),
+            )
+            for number in range(groups)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+    group_ids = list(Group.objects.values_list('id', flat=True)) + [None]
+    Post.objects.bulk_create(
+        (
+            Post(
+                author_id=rng.choice(user_ids),
+                group_id=rng.choice(group_ids),
+                text=fake.text(max_nb_chars=400),
+            )
+            for _ in range(posts)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    post_ids = list(Post.objects.values_list('id', flat=True))
+    Comment.objects.bulk_create(
+        (
+            Comment(
+                post_id=rng.choice(post_ids),
+                author_id=rng.choice(user_ids),
+                text=fake.sentence(),
+            )
+            for _ in range(comments)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    pairs = {
+        tuple(rng.sample(user_ids, 2))
+        for _ in range(follows)
+    } if len(user_ids) > 1 else set()
+    Follow.objects.bulk_create(
+        (Follow(user_id=user, author_id=author) for user, author in pairs),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    counters.recount()
+    feed.rebuild()
+
+
+def sample_routes():
+    """Маршрут, аргументы и пользователь для каждой страницы posts."""
+    post = Post.objects.select_related('author').order_by(
+        '-comments_count', '-id'
+    ).first()
+    follow = Follow.objects.select_related('user', 'author').first()
+    group = Group.objects.first()
+    if post is None or group is None:
+        raise LookupError('Нужны хотя бы один пост и одна группа')
+    reader = follow.user if follow else User.objects.exclude(
+        id=post.author_id
+    ).first()
+    if reader is None:
+        raise LookupError('Нужны хотя бы два пользователя')
+    author = follow.author if follow else post.author
+    return (
+        Route('posts:index', (), reader, 'get', None),
+        Route('posts:group_index', (), reader, 'get', None),
+        Route('posts:group_list', (group.slug,), reader, 'get', None),
+        Route('posts:profile', (author.username,), reader, 'get', None),
+        Route('posts:post_detail', (post.id,), reader, 'get', None),
+        Route('posts:comments', (post.id,), reader, 'get', None),
+        Route('posts:search', (), reader, 'get',
+              {'q': post.text.split()[0] if post.text.split() else ''}),
+        Route('posts:post_create', (), reader, 'get', None),
+        Route('posts:post_edit', (post.id,), post.author, 'get', None),
+        Route('posts:add_comment', (post.id,), reader, 'post',
+              {'text': 'Комментарий для замера'}),
+        Route('posts:follow_index', (), reader, 'get', None),
+        Route('posts:profile_follow', (author.username,), reader, 'get',
+              None),
+        Route('posts:profile_unfollow', (author.username,), reader, 'get',
+              None),
+        Route('posts:api_index', (), reader, 'get', None),
+        Route('posts:api_post', (post.id,), reader, 'get', None),
+        Route('posts:api_group', (group.slug,), reader, 'get', None),
+        Route('posts:api_profile', (author.username,), reader, 'get', None),
+        Route('posts:api_follow', (), reader, 'get', None),
+    )
+
+
+@contextmanager
+def capture_queries():
+    """Список запросов ко всем базам: чтения с реплик тоже в счёт."""
+    with ExitStack() as stack:
+        contexts = [
+            stack.enter_context(CaptureQueriesContext(connections[alias]))
+            for alias in connections
+        ]
+        queries = []
+        yield queries
+    for context in contexts:
+        queries += context.captured_queries
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def measure(route, repeat=20):
+    """Худшее число запросов и p50/p95 времени ответа в миллисекундах.
+
+    Маршрут открывается авторизованным клиентом, поэтому кэш страниц
+    для анонимов не скрывает запросы.
+    """
+    client = Client()
+    client.force_login(route.user)
+    url = reverse(route.name, args=route.args)
+    timings = []
+    queries = 0
+    status = None
+    for _ in range(repeat):
+        with capture_queries() as captured:
+            started = perf_counter()
+            response = getattr(client, route.method)(url, route.data)
+            timings.append((perf_counter() - started) * 1000)
+        queries = max(queries, sum(
+            not query['sql'].startswith(TRANSACTION_STATEMENTS)
+            for query in captured
+        ))
+        status = response.status_code
+    return {
+        'queries': queries,
+        'budget': QUERY_BUDGETS.get(route.name),
+        'status': status,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+    }
+
+
+def run(repeat=20):
+    return {
+        route.name: measure(route, repeat) for route in sample_routes()
+    }
+
+
+def over_budget(report):
+    return [
+        f'{name}: {row["queries"]} запросов при бюджете {row["budget"]}'
+        for name, row in report.items()
+        if row['budget'] is not None and row['queries'] > row['budget']
+    ]
+
+
+def regressions(report, baseline, tolerance=0.2):
+    """Сравнивает отчёт с отчётом предыдущего коммита."""
+    problems = []
+    for name, row in report.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if row['queries'] > before['queries']:
+            problems.append(
+                f'{name}: запросов {before["queries"]} -> {row["queries"]}'
+            )
+        if row['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            problems.append(
+                f'{name}: p95 {before["p95_ms"]} -> {row["p95_ms"]} мс'
+            )
+    return problems
@@ -0,0 +1,73 @@
+"""Кэш отрендеренных карточек постов.
+
+Карточка кэшируется по ключу ``card:<id>:<version>:<вариант>``. Версия
+поста растёт при его редактировании, а также при изменении автора или
+группы, поэтому устаревшие карточки не удаляются, а просто перестают
+запрашиваться. Страница ленты достаёт все карточки одним ``get_many``:
+
+    {% post_cards page_obj as cards %}
+    {% for card in cards %}{{ card }}{% endfor %}
+"""
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core import metrics
+from yatube.settings import CARD_CACHE_TIMEOUT
+
+from .models import Post
+
+CARD_TEMPLATE = 'posts/includes/card_of_post.html'
+# Поля автора, которые выводятся в карточке
+AUTHOR_CARD_FIELDS = frozenset(('username', 'first_name', 'last_name'))
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def card_key(post, profile_need_post=False, group_need_post=False):
+    variant = f'{int(bool(profile_need_post))}{int(bool(group_need_post))}'
+    return f'card:{post.id}:{post.version}:{variant}'
+
+
+def render_cards(posts, **flags):
+    """Список HTML карточек ``posts``; промахи кэша дорендериваются."""
+    posts = list(posts)
+    keys = [card_key(post, **flags) for post in posts]
+    cached = cache.get_many(keys)
+    missing = {}
+    cards = []
+    for key, post in zip(keys, posts):
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string(CARD_TEMPLATE, {'post': post, **flags})
+            missing[key] = html
+        cards.append(html)
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+    metrics.record_cache(
+        'cards', hits=len(posts) - len(missing), misses=len(missing)
+    )
+    with _stats_lock:
+        _stats['hits'] += len(posts) - len(missing)
+        _stats['misses'] += len(missing)
+    return [mark_safe(html) for html in cards]
+
+
+def bump_versions(**lookup):
+    """Сбрасывает карточки всех постов, подходящих под ``lookup``."""
+    Post.objects.filter(**lookup).update(version=F('version') + 1)
+
+
+def stats():
+    with _stats_lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses']}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
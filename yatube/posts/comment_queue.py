@@ -0,0 +1,278 @@
+"""Отложенная запись комментариев (write-behind).
+
+При ``COMMENT_WRITE_BEHIND`` ``add_comment`` не вставляет комментарий в
+базу, а дописывает строку JSON в файл очереди в ``COMMENT_QUEUE_DIR`` с
+``fsync``: после ответа комментарий не потеряется и при падении
+процесса. Фоновый поток раз в ``COMMENT_FLUSH_INTERVAL`` секунд
+переименовывает файл и переносит его в базу пачками по
+``COMMENT_FLUSH_BATCH`` в одной транзакции на пачку — вместо сотни
+коротких транзакций за единственную блокировку записи SQLite борется
+одна. ``manage.py flush_comments`` делает то же вручную.
+
+Пока комментарий в очереди, автор видит его из кэша (``pending``).
+Каждая запись лежит под своим ключом с номером из ``cache.incr``, так
+что две быстрые отправки не затирают друг друга. Кэш у каждого процесса
+свой, а очередь общая: запись, которую перенёс другой процесс, здесь
+останется, поэтому при показе отбрасываются комментарии, чья дата уже
+есть в базе.
+Файл удаляется после вставки; если процесс упал между ними, при
+повторном проходе уже вставленные комментарии узнаются по
+``(post, author, created)`` и пропускаются. Даты берутся из очереди:
+``auto_now_add`` ставит при вставке текущее время, и ``restore_created``
+переписывает его по id, назначенным под блокировкой записи.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.routers import use_primary
+from yatube.settings import (
+    COMMENT_FLUSH_BATCH, COMMENT_FLUSH_INTERVAL, COMMENT_QUEUE_DIR,
+)
+
+from . import counters
+from .models import Comment, Post
+from .transfer import next_id, restore_created
+
+logger = logging.getLogger(__name__)
+
+QUEUE_NAME = 'queue.jsonl'
+FLUSHING_PREFIX = 'flushing-'
+QUEUE_LOCK = 'queue.lock'
+FLUSH_LOCK = 'flush.lock'
+# Ожидающие комментарии живут в кэше, пока их не перенесут в базу
+PENDING_TIMEOUT = 60 * 60
+
+_locks = {QUEUE_LOCK: threading.Lock(), FLUSH_LOCK: threading.Lock()}
+_wakeup = threading.Event()
+_worker_lock = threading.Lock()
+_worker = None
+
+
+def _path(name):
+    return os.path.join(COMMENT_QUEUE_DIR, name)
+
+
+@contextmanager
+def _locked(name):
+    """Блокировка и между потоками процесса, и между процессами."""
+    os.makedirs(COMMENT_QUEUE_DIR, exist_ok=True)
+    with _locks[name], open(_path(name), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _pending_key(post_id, author_id, seq=None):
+    key = f'comments:pending:{post_id}:{author_id}'
+    return key if seq is None else f'{key}:{seq}'
+
+
+def _remember(entry):
+    counter = _pending_key(entry['post'], entry['author'])
+    while True:
+        cache.add(counter, 0, PENDING_TIMEOUT)
+        try:
+            seq = cache.incr(counter)
+        except ValueError:
+            # Счётчик истёк между add и incr
+            continue
+        # Счётчик должен жить не меньше своих записей
+        cache.touch(counter, PENDING_TIMEOUT)
+        if cache.add(
+            _pending_key(entry['post'], entry['author'], seq),
+            entry, PENDING_TIMEOUT,
+        ):
+            return
+
+
+def _remembered(post_id, author_id):
+    """``{ключ: запись}`` ожидающих комментариев в порядке отправки."""
+    count = cache.get(_pending_key(post_id, author_id), 0)
+    keys = [
+        _pending_key(post_id, author_id, seq) for seq in range(1, count + 1)
+    ]
+    found = cache.get_many(keys)
+    return {key: found[key] for key in keys if key in found}
+
+
+def _comment(entry, author=None):
+    comment = Comment(
+        post_id=entry['post'],
+        author_id=entry['author'],
+        text=entry['text'],
+        created=parse_datetime(entry['created']),
+    )
+    if author is not None:
+        comment.author = author
+    comment.pending = True
+    return comment
+
+
+def enqueue(post_id, author, text):
+    """Ставит комментарий в очередь; возвращает несохранённый объект."""
+    entry = {
+        'uid': uuid.uuid4().hex,
+        'post': post_id,
+        'author': author.id,
+        'text': text,
+        'created': timezone.now().isoformat(),
+    }
+    line = (json.dumps(entry, ensure_ascii=False) + '\n').encode()
+    with _locked(QUEUE_LOCK):
+        fd = os.open(
+            _path(QUEUE_NAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600
+        )
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    _remember(entry)
+    start_worker()
+    return _comment(entry, author)
+
+
+def pending(post_id, user):
+    """Комментарии ``user`` к посту, ещё не перенесённые в базу."""
+    if not user.is_authenticated:
+        return []
+    comments = [
+        _comment(entry, user)
+        for entry in _remembered(post_id, user.id).values()
+    ]
+    if not comments:
+        return []
+    inserted = set(Comment.objects.filter(
+        post_id=post_id,
+        author_id=user.id,
+        created__in={comment.created for comment in comments},
+    ).values_list('created', flat=True))
+    return [
+        comment for comment in comments if comment.created not in inserted
+    ]
+
+
+def _read(path):
+    entries = []
+    with open(path, encoding='utf-8') as lines:
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Недописанная строка: процесс упал посреди записи
+                logger.warning('Пропущена битая строка очереди: %r', line)
+    return entries
+
+
+def _insert(entries):
+    post_ids = set(Post.objects.filter(
+        id__in={entry['post'] for entry in entries}
+    ).values_list('id', flat=True))
+    comments = [
+        _comment(entry) for entry in entries if entry['post'] in post_ids
+    ]
+    # Повторный проход после сбоя: эти комментарии уже в базе
+    inserted = set(Comment.objects.filter(
+        post_id__in=post_ids,
+        created__in={comment.created for comment in comments},
+    ).values_list('post_id', 'author_id', 'created'))
+    comments = [
+        comment for comment in comments
+        if (comment.post_id, comment.author_id, comment.created)
+        not in inserted
+    ]
+    if not comments:
+        return 0
+    dates = [comment.created for comment in comments]
+    with transaction.atomic():
+        # Счётчики пишутся первыми: после UPDATE транзакция держит
+        # блокировку записи SQLite, и до коммита максимум id не сдвинется
+        for post_id, count in Counter(
+            comment.post_id for comment in comments
+        ).items():
+            counters.post_comments_changed(post_id, count)
+        for comment_id, comment in enumerate(comments, next_id(Comment)):
+            comment.id = comment_id
+        Comment.objects.bulk_create(comments)
+        restore_created(comments, dates)
+    return len(comments)
+
+
+def _forget_pending(entries):
+    uids = {entry['uid'] for entry in entries}
+    for post_id, author_id in {
+        (entry['post'], entry['author']) for entry in entries
+    }:
+        cache.delete_many([
+            key for key, entry in _remembered(post_id, author_id).items()
+            if entry['uid'] in uids
+        ])
+
+
+def _rotate():
+    with _locked(QUEUE_LOCK):
+        queue = _path(QUEUE_NAME)
+        if os.path.exists(queue) and os.path.getsize(queue):
+            os.rename(
+                queue, _path(f'{FLUSHING_PREFIX}{time.time_ns()}.jsonl')
+            )
+
+
+def flush():
+    """Переносит очередь в базу; возвращает число новых комментариев."""
+    total = 0
+    with _locked(FLUSH_LOCK):
+        _rotate()
+        names = sorted(
+            name for name in os.listdir(COMMENT_QUEUE_DIR)
+            if name.startswith(FLUSHING_PREFIX)
+        )
+        for name in names:
+            entries = _read(_path(name))
+            for start in range(0, len(entries), COMMENT_FLUSH_BATCH):
+                total += _insert(entries[start:start + COMMENT_FLUSH_BATCH])
+            os.remove(_path(name))
+            _forget_pending(entries)
+    return total
+
+
+def _run():
+    while True:
+        _wakeup.wait()
+        # Пауза копит пачку: чем больше комментариев, тем реже транзакции
+        time.sleep(COMMENT_FLUSH_INTERVAL)
+        _wakeup.clear()
+        close_old_connections()
+        try:
+            with use_primary():
+                flush()
+        except Exception:
+            logger.exception('Не удалось перенести очередь комментариев')
+            _wakeup.set()
+        finally:
+            connections.close_all()
+
+
+def start_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_run, name='yatube-comments', daemon=True
+            )
+            _worker.start()
+    _wakeup.set()
@@ -0,0 +1,104 @@
+"""Денормализованные счётчики постов, подписок и комментариев.
+
+У группы кроме числа постов хранится дата последнего поста: её
+пересчитывает подзапрос по индексу ``(group, created)``, так что перенос
+старого поста из группы или в группу тоже учитывается.
+
+Счётчики меняются F-выражениями из обработчиков сигналов в той же
+транзакции, что и сама запись. Массовые операции (``bulk_create``,
+``QuerySet.update``) сигналов не шлют — после них нужен ``recount()``
+или команда ``manage.py recount_counters``. Уменьшение не опускает
+счётчик ниже нуля: если он разошёлся с данными, удаление не упадёт на
+``CHECK >= 0``, а точное значение вернёт пересчёт.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .groups import forget_groups
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _shifted(field, delta):
+    return Greatest(F(field) + delta, 0)
+
+
+def _add(queryset, field, delta):
+    queryset.update(**{field: _shifted(field, delta)})
+
+
+def user_changed(user_id, field, delta):
+    _add(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def post_comments_changed(post_id, delta):
+    _add(Post.objects.filter(id=post_id), 'comments_count', delta)
+
+
+def _last_post_at():
+    return Subquery(
+        Post.objects.filter(group=OuterRef('id'))
+        .order_by('-created')
+        .values('created')[:1]
+    )
+
+
+def groups_changed(deltas):
+    """Сдвигает ``posts_count`` групп на ``{id группы: приращение}``."""
+    for group_id, delta in deltas.items():
+        if delta:
+            Group.objects.filter(id=group_id).update(
+                posts_count=_shifted('posts_count', delta),
+                last_post_at=_last_post_at(),
+            )
+
+
+def stats_for(user):
+    """Счётчики пользователя; недостающая строка пересчитывается."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        UserStats.objects.get_or_create(user=user)
+        recount(
+            User.objects.filter(id=user.id),
+            posts=Post.objects.none(),
+            groups=Group.objects.none(),
+        )
+        user.stats = UserStats.objects.get(user=user)
+        return user.stats
+
+
+def _count(model, field, outer='user'):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('id'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def recount(users=None, posts=None, groups=None):
+    """Пересчитывает счётчики набором UPDATE ... SET = (подзапрос)."""
+    users = User.objects.all() if users is None else users
+    missing = users.filter(stats__isnull=True).values_list('id', flat=True)
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id) for user_id in missing),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    UserStats.objects.filter(user__in=users).update(
+        posts_count=_count(Post, 'author'),
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'),
+    )
+    posts = Post.objects.all() if posts is None else posts
+    posts.update(comments_count=_count(Comment, 'post', outer='id'))
+    groups = Group.objects.all() if groups is None else groups
+    groups.update(
+        posts_count=_count(Post, 'group', outer='id'),
+        last_post_at=_last_post_at(),
+    )
+    forget_groups(*groups.values_list('slug', flat=True))
@@ -0,0 +1,160 @@
+"""Лента подписок с разветвлением при записи (fan-out-on-write).
+
+Новый пост раскладывается в ``FeedEntry`` всем подписчикам автора, поэтому
+страница ``follow_index`` читается одним диапазоном по индексу
+``(user, created)``. Посты авторов, у которых подписчиков больше
+``FEED_FANOUT_LIMIT``, не раскладываются, а подмешиваются при чтении.
+
+Запись решает, раскладывать ли пост, по числу подписчиков в базе.
+Множество таких авторов для чтения тоже считается по базе и хранится в
+кэше ``FEED_CELEBRITIES_TIMEOUT`` секунд: у каждого процесса свой кэш, и
+копия, которую нельзя поправить атомарно, разошлась бы навсегда.
+"""
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from core import tasks
+from yatube.settings import (
+    FEED_BACKFILL, FEED_CELEBRITIES_TIMEOUT, FEED_FANOUT_LIMIT,
+)
+
+from . import follows
+from .models import FeedEntry, Follow, Post
+
+CELEBRITIES_KEY = 'feed:celebrities'
+BATCH_SIZE = 500
+
+
+def celebrities():
+    """Множество id авторов, чьи посты читаются без материализации."""
+    ids = cache.get(CELEBRITIES_KEY)
+    if ids is None:
+        ids = set(
+            Follow.objects.values('author')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=FEED_FANOUT_LIMIT)
+            .values_list('author', flat=True)
+        )
+        cache.set(CELEBRITIES_KEY, ids, FEED_CELEBRITIES_TIMEOUT)
+    return ids
+
+
+def _is_celebrity(author_id):
+    followers = Follow.objects.filter(author_id=author_id).count()
+    return followers > FEED_FANOUT_LIMIT
+
+
+def refresh_celebrity(author_id, followed):
+    """Следит, не пересёк ли автор порог подписчиков.
+
+    Вызывается после подписки (``followed``) или отписки, когда строка
+    ``Follow`` уже записана. Порог пересечён, только если подписчиков
+    стало ровно ``FEED_FANOUT_LIMIT + 1`` после подписки или ровно
+    ``FEED_FANOUT_LIMIT`` после отписки.
+    """
+    followers = Follow.objects.filter(author_id=author_id).count()
+    if followers != FEED_FANOUT_LIMIT + followed:
+        return
+    cache.delete(CELEBRITIES_KEY)
+    if not followed:
+        # Пока автор читался при запросе, его посты не раскладывались
+        tasks.submit_on_commit(backfill_followers, author_id)
+
+
+def backfill_followers(author_id):
+    for user_id in Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator():
+        backfill(user_id, author_id)
+
+
+def _entries(user_ids, posts):
+    return (
+        FeedEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            created=post.created,
+        )
+        for user_id in user_ids
+        for post in posts
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if _is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        _entries(followers, (post,)),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id, limit=FEED_BACKFILL):
+    """Добавляет в ленту свежие посты автора при подписке."""
+    if _is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).only(
+        'id', 'author_id', 'created'
+    )[:limit]
+    FeedEntry.objects.bulk_create(
+        _entries((user_id,), posts),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(limit=FEED_BACKFILL):
+    """Пересобирает все ленты одним INSERT ... SELECT.
+
+    Нужен после массовых операций, которые не шлют сигналов. Как и при
+    подписке, от каждого автора в ленту попадают ``limit`` свежих постов.
+    """
+    cache.delete(CELEBRITIES_KEY)
+    excluded = sorted(celebrities()) or [0]
+    qn = connection.ops.quote_name
+    entry, follow, post = (
+        qn(model._meta.db_table) for model in (FeedEntry, Follow, Post)
+    )
+    placeholders = ', '.join(['%s'] * len(excluded))
+    with transaction.atomic(), connection.cursor() as cursor:
+        FeedEntry.objects.all().delete()
+        cursor.execute(
+            f'INSERT INTO {entry} (user_id, post_id, author_id, created) '
+            f'SELECT f.user_id, p.id, p.author_id, p.created '
+            f'FROM {follow} f INNER JOIN ('
+            f'SELECT id, author_id, created, ROW_NUMBER() OVER ('
+            f'PARTITION BY author_id ORDER BY created DESC) AS position '
+            f'FROM {post}) p '
+            f'ON p.author_id = f.author_id '
+            f'WHERE p.position <= %s AND f.author_id NOT IN ({placeholders})',
+            [limit, *excluded],
+        )
+
+
+def feed_posts(user):
+    """Посты ленты подписок ``user``, от новых к старым."""
+    posts = Post.objects.select_related('author', 'group')
+    ids = celebrities()
+    followed_celebrities = (
+        sorted(follows.followees(user.id) & ids) if ids else []
+    )
+    if not followed_celebrities:
+        return posts.filter(feed_entries__user=user).order_by(
+            '-feed_entries__created', '-feed_entries__id'
+        )
+    materialized = FeedEntry.objects.filter(user=user).values('post_id')
+    return posts.filter(
+        Q(pk__in=materialized) | Q(author_id__in=followed_celebrities)
+    )
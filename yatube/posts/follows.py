@@ -0,0 +1,65 @@
+"""Граф подписок: множества авторов пользователя в кэше.
+
+Множество id авторов, на которых подписан пользователь, читается из
+базы один раз и хранится в кэше; обработчики сигналов ``Follow``
+сбрасывают его после коммита подписки или отписки. «Подписан ли» для
+любого числа авторов — проверка по этому множеству без запросов.
+
+Подписка — одна вставка: повтор отсекает ограничение
+``posts_follow_unique``, а не предварительный ``exists()``, поэтому два
+одновременных запроса не создадут дубликат.
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from yatube.settings import FOLLOWS_CACHE_TIMEOUT
+
+from .models import Follow
+
+
+def _key(user_id):
+    return f'follows:{user_id}'
+
+
+def followees(user_id):
+    """Множество id авторов, на которых подписан ``user_id``."""
+    ids = cache.get(_key(user_id))
+    if ids is None:
+        ids = set(
+            Follow.objects.filter(user_id=user_id)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(_key(user_id), ids, FOLLOWS_CACHE_TIMEOUT)
+    return ids
+
+
+def forget(*user_ids):
+    cache.delete_many([_key(user_id) for user_id in user_ids])
+
+
+def is_following(user, authors):
+    """``{id автора: подписан ли user}`` для пользователей или их id."""
+    author_ids = [getattr(author, 'id', author) for author in authors]
+    if not user.is_authenticated:
+        return dict.fromkeys(author_ids, False)
+    ids = followees(user.id)
+    return {author_id: author_id in ids for author_id in author_ids}
+
+
+def follow(user, author):
+    """Подписывает; ``False``, если подписка уже была или это сам автор."""
+    if user.id == author.id:
+        return False
+    try:
+        # Точка сохранения: ошибка не ломает внешнюю транзакцию
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user, author):
+    """Отписывает; ``False``, если подписки не было."""
+    deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    return bool(deleted)
@@ -0,0 +1,31 @@
+"""Группа по slug из кэша.
+
+Страница группы и её JSON-версия ищут группу по slug на каждый запрос.
+Объект группы меняется редко, поэтому он хранится в кэше вместе со
+счётчиком постов, которым паджинатор заменяет ``COUNT(*)``. Запись
+сбрасывают обработчики сигналов при правке группы и при изменении её
+счётчика.
+"""
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+
+from yatube.settings import GROUP_CACHE_TIMEOUT
+
+from .models import Group
+
+
+def _key(slug):
+    return f'group:{slug}'
+
+
+def group_by_slug(slug):
+    """Как ``get_object_or_404(Group, slug=slug)``, но через кэш."""
+    group = cache.get(_key(slug))
+    if group is None:
+        group = get_object_or_404(Group, slug=slug)
+        cache.set(_key(slug), group, GROUP_CACHE_TIMEOUT)
+    return group
+
+
+def forget_groups(*slugs):
+    cache.delete_many([_key(slug) for slug in slugs])
@@ -0,0 +1,108 @@
+"""Обработка загруженных картинок постов.
+
+В запросе картинка только проверяется: ``validate_upload`` читает
+заголовок файла (формат и размеры), не декодируя пиксели, и отклоняет
+слишком большие файлы и изображения. Крупные загрузки Django и так пишет
+на диск кусками (``FILE_UPLOAD_MAX_MEMORY_SIZE``).
+
+Всё тяжёлое идёт в фоновой задаче ``process``: картинка поворачивается
+по EXIF, уменьшается до ``IMAGE_MAX_SIDE`` по большей стороне и
+перекодируется в WebP без метаданных, после чего по ней строятся
+миниатюры. Ширина и высота итоговой картинки записываются в пост, чтобы
+шаблоны выводили размеры, не открывая файл.
+"""
+import io
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from core import tasks
+from yatube.settings import (
+    IMAGE_FORMATS, IMAGE_MAX_PIXELS, IMAGE_MAX_SIDE, IMAGE_MAX_UPLOAD_SIZE,
+    IMAGE_WEBP_QUALITY,
+)
+
+from . import thumbnails
+from .models import Post
+
+OUTPUT_FORMAT = 'WEBP'
+OUTPUT_SUFFIX = '.webp'
+
+
+def validate_upload(file_):
+    """Проверяет загрузку по заголовку; возвращает ``(ширина, высота)``."""
+    if file_.size > IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ',
+            code='file_too_large',
+            params={'limit': IMAGE_MAX_UPLOAD_SIZE // 2 ** 20},
+        )
+    file_.seek(0)
+    try:
+        # Image.open читает только заголовок, пиксели не декодируются
+        with Image.open(file_) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Файл не похож на картинку', code='invalid_image'
+        )
+    finally:
+        file_.seek(0)
+    if image_format not in IMAGE_FORMATS:
+        raise ValidationError(
+            'Поддерживаются форматы: %(formats)s',
+            code='invalid_format',
+            params={'formats': ', '.join(IMAGE_FORMATS)},
+        )
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)d мегапикселей',
+            code='too_many_pixels',
+            params={'limit': IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    return width, height
+
+
+def reencode(source):
+    """WebP не больше ``IMAGE_MAX_SIDE`` без метаданных: (байты, w, h)."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert(
+                'RGBA' if 'transparency' in image.info
+                or image.mode in ('LA', 'PA') else 'RGB'
+            )
+        output = io.BytesIO()
+        # exif и icc_profile не передаются — метаданные не попадут в файл
+        image.save(output, OUTPUT_FORMAT, quality=IMAGE_WEBP_QUALITY)
+        return output.getvalue(), image.width, image.height
+
+
+def process(post_id):
+    post = Post.objects.filter(id=post_id).first()
+    if post is None or not post.image:
+        return
+    original = post.image.name
+    with post.image.open('rb') as source:
+        content, width, height = reencode(source)
+    storage = post.image.storage
+    stem = os.path.splitext(os.path.basename(original))[0]
+    name = storage.save(
+        post.image.field.generate_filename(post, stem + OUTPUT_SUFFIX),
+        ContentFile(content),
+    )
+    # UPDATE без сигналов; если картинку успели заменить, результат лишний
+    if not Post.objects.filter(id=post_id, image=original).update(
+        image=name, image_width=width, image_height=height
+    ):
+        storage.delete(name)
+        return
+    storage.delete(original)
+    thumbnails.generate(post_id)
+
+
+def schedule(post):
+    tasks.submit_on_commit(process, post.id)
@@ -0,0 +1,98 @@
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from posts.budget import sample_routes
+
+BAD_PLAN_STEPS = ('USE TEMP B-TREE',)
+AUDITED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+
+def is_full_scan(detail, sql):
+    # Запрос без WHERE (например, список групп в форме) читает всю
+    # таблицу намеренно; виртуальная таблица FTS5 ищет по своему индексу
+    return (
+        detail.startswith('SCAN')
+        and ' USING ' not in detail
+        and ' VIRTUAL TABLE ' not in detail
+        and ' WHERE ' in sql
+    )
+
+
+def plan_problems(details, sql):
+    # Ранжирование полнотекстового поиска по релевантности всегда
+    # сортирует найденное, индекс B-дерева тут помочь не может
+    ranked = any(' VIRTUAL TABLE ' in detail for detail in details)
+    return [
+        detail for detail in details
+        if is_full_scan(detail, sql)
+        or (detail.startswith(BAD_PLAN_STEPS) and not ranked)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет каждую страницу приложения posts на текущей базе и '
+        'проверяет EXPLAIN QUERY PLAN всех её запросов: полный просмотр '
+        'таблицы или сортировка во временном B-дереве считаются ошибкой.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN поддерживается для SQLite')
+        try:
+            routes = sample_routes()
+        except LookupError as error:
+            raise CommandError(f'Недостаточно данных для проверки: {error}')
+        problems = []
+        with transaction.atomic():
+            for route in routes:
+                name = route.name
+                statements = self.capture(route)
+                for alias, sql, params in statements:
+                    details = self.explain(alias, sql, params)
+                    problems += [
+                        (name, detail, sql)
+                        for detail in plan_problems(details, sql)
+                    ]
+                self.stdout.write(
+                    f'{name}: проверено запросов {len(statements)}'
+                )
+            # Страницы подписки пишут в базу: откатываем их изменения
+            transaction.set_rollback(True)
+        for name, detail, sql in problems:
+            self.stderr.write(f'{name}: {detail}\n    {sql}')
+        if problems:
+            raise CommandError(f'Найдено проблемных планов: {len(problems)}')
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
+
+    def capture(self, route):
+        path = reverse(route.name, args=route.args)
+        request = getattr(RequestFactory(), route.method)(path, route.data)
+        request.user = route.user
+        match = resolve(path)
+        statements = []
+
+        def recorder(alias):
+            def record(execute, sql, params, many, context):
+                if sql.lstrip().upper().startswith(AUDITED_STATEMENTS):
+                    statements.append((alias, sql, params))
+                return execute(sql, params, many, context)
+            return record
+
+        # Чтения могут уйти на реплики: запросы собираются со всех баз
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(recorder(alias))
+                )
+            match.func(request, *match.args, **match.kwargs)
+        return statements
+
+    def explain(self, alias, sql, params):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
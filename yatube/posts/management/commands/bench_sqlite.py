@@ -0,0 +1,148 @@
+import shutil
+import tempfile
+import threading
+from collections import defaultdict
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.test import Client
+from django.urls import reverse
+
+from posts import budget
+from posts.models import Post, User
+from yatube.settings import CONN_MAX_AGE, SQLITE_PRAGMAS
+
+PROFILES = {
+    'без настройки': {'PRAGMAS': {}, 'CONN_MAX_AGE': 0},
+    'WAL + PRAGMA': {'PRAGMAS': SQLITE_PRAGMAS, 'CONN_MAX_AGE': CONN_MAX_AGE},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite без настройки и с '
+        'SQLITE_PRAGMAS и CONN_MAX_AGE: потоки-читатели открывают главную, '
+        'потоки-писатели одновременно добавляют комментарии. Каждый '
+        'профиль работает со своим временным файлом базы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5.0)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        settings_dict = connections['default'].settings_dict
+        saved = dict(settings_dict)
+        directory = tempfile.mkdtemp()
+        results = {}
+        try:
+            for number, (name, profile) in enumerate(PROFILES.items()):
+                connections.close_all()
+                settings_dict.update(
+                    NAME=f'{directory}/bench{number}.sqlite3', **profile
+                )
+                call_command('migrate', verbosity=0, interactive=False)
+                budget.seed(
+                    users=options['users'], posts=options['posts'],
+                    comments=options['posts'], follows=0, groups=2,
+                )
+                connections.close_all()
+                cache.clear()
+                results[name] = self.hammer(
+                    options['readers'], options['writers'],
+                    options['duration'],
+                )
+                self.report(name, results[name], options['duration'])
+        finally:
+            connections.close_all()
+            settings_dict.clear()
+            settings_dict.update(saved)
+            shutil.rmtree(directory, ignore_errors=True)
+        before, after = (
+            sum(row['ok'] for row in result.values())
+            for result in results.values()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пропускная способность: x{after / (before or 1):.2f}'
+        ))
+
+    def hammer(self, readers, writers, duration):
+        user_ids = list(
+            User.objects.values_list('id', flat=True)[:readers + writers]
+        )
+        post_ids = list(Post.objects.values_list('id', flat=True)[:100])
+        connections.close_all()
+        stats = defaultdict(lambda: {'ok': 0, 'errors': 0, 'latencies': []})
+        lock = threading.Lock()
+        start = threading.Barrier(readers + writers)
+
+        def worker(number, kind):
+            client = Client()
+            # Авторизованные читатели проходят мимо кэша страниц
+            client.force_login(User.objects.get(id=user_ids[number]))
+            close_old_connections()
+            start.wait()
+            deadline = perf_counter() + duration
+            ok = errors = 0
+            latencies = []
+            while perf_counter() < deadline:
+                began = perf_counter()
+                try:
+                    if kind == 'add_comment':
+                        post_id = post_ids[ok % len(post_ids)]
+                        response = client.post(
+                            reverse('posts:add_comment', args=(post_id,)),
+                            {'text': 'Нагрузочный комментарий'},
+                        )
+                    else:
+                        response = client.get(reverse('posts:index'))
+                    if response.status_code < 400:
+                        ok += 1
+                    else:
+                        errors += 1
+                except Exception:
+                    # Чаще всего «database is locked» от конкурента
+                    errors += 1
+                latencies.append(perf_counter() - began)
+                # Тестовый клиент не шлёт request_finished с закрытием
+                # соединений, а WSGI-сервер шлёт: CONN_MAX_AGE работает так
+                close_old_connections()
+            connections.close_all()
+            with lock:
+                stats[kind]['ok'] += ok
+                stats[kind]['errors'] += errors
+                stats[kind]['latencies'] += latencies
+
+        threads = [
+            threading.Thread(target=worker, args=(number, 'index'))
+            for number in range(readers)
+        ] + [
+            threading.Thread(
+                target=worker, args=(readers + number, 'add_comment')
+            )
+            for number in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return dict(stats)
+
+    def report(self, name, result, duration):
+        self.stdout.write(name)
+        for kind, row in result.items():
+            # Все запросы сценария могли закончиться ошибкой
+            p95 = (
+                f'{budget.percentile(row["latencies"], 0.95) * 1000:.1f} мс'
+                if row['latencies'] else 'n/a'
+            )
+            self.stdout.write(
+                f'  {kind:<12} {row["ok"] / duration:>8.1f} запросов/с, '
+                f'p95 {p95}, ошибок {row["errors"]}'
+            )
@@ -0,0 +1,158 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import get_template
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from core.warmup import warm_up_templates
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Group, Post, User, UserStats
+from posts.search import SearchPage, SearchResult
+from posts.utils import CursorPage
+from yatube.settings import PAGE_LIMIT
+
+LOADERS = (
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+)
+# Отдельный кэш: карточки и фрагменты не должны браться из общего
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-templates',
+    }
+}
+
+
+def templates_with_loaders(loaders):
+    backend = dict(settings.TEMPLATES[0])
+    backend['APP_DIRS'] = False
+    backend['OPTIONS'] = {**backend['OPTIONS'], 'loaders': loaders}
+    return [backend]
+
+
+PROFILES = {
+    'без кэша': templates_with_loaders(list(LOADERS)),
+    'cached.Loader': templates_with_loaders(
+        [('django.template.loaders.cached.Loader', list(LOADERS))]
+    ),
+}
+
+
+def synthetic_contexts():
+    """Контексты страниц из несохранённых объектов, без запросов к базе."""
+    now = timezone.now()
+    author = User(
+        id=1, username='bench', first_name='Анна', last_name='Иванова'
+    )
+    group = Group(
+        id=1, slug='bench', title='Сообщество', description='Описание',
+        posts_count=PAGE_LIMIT, last_post_at=now,
+    )
+    posts = [
+        Post(
+            id=number, author=author, group=group, created=now,
+            updated=now, comments_count=3,
+            text='Текст поста для замера рендера шаблонов. ' * 10,
+        )
+        for number in range(1, PAGE_LIMIT + 1)
+    ]
+    page = Paginator(posts, PAGE_LIMIT).page(1)
+    comments = CursorPage(
+        [
+            Comment(
+                id=number, post=posts[0], author=author, created=now,
+                text='Комментарий',
+            )
+            for number in range(1, PAGE_LIMIT + 1)
+        ],
+        None, False, False,
+    )
+    return {
+        'posts/index.html': {'page_obj': page},
+        'posts/follow.html': {'favorites': page},
+        'posts/group_list.html': {'group': group, 'page_obj': page},
+        'posts/group_index.html': {
+            'page_obj': Paginator([group] * PAGE_LIMIT, PAGE_LIMIT).page(1),
+        },
+        'posts/profile.html': {
+            'author': author, 'page_obj': page, 'count': PAGE_LIMIT,
+            'stats': UserStats(user=author, posts_count=PAGE_LIMIT),
+            'following': False,
+        },
+        'posts/post_detail.html': {
+            'post': posts[0], 'form': CommentForm(), 'comments': comments,
+            'page_obj': comments, 'count': PAGE_LIMIT,
+        },
+        'posts/create_post.html': {'form': PostForm()},
+        'posts/search.html': {
+            'query': 'замер',
+            'results': SearchPage(
+                [SearchResult(post, 'Текст <b>замер</b>') for post in posts],
+                None,
+            ),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Рендерит шаблоны страниц posts с синтетическим контекстом без '
+        'кэша загрузчика и с cached.Loader. Разница — время чтения и '
+        'разбора шаблонов, которое платит каждый запрос при DEBUG.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        contexts = synthetic_contexts()
+        results = {}
+        with override_settings(CACHES=BENCH_CACHES):
+            for profile, templates in PROFILES.items():
+                with override_settings(TEMPLATES=templates):
+                    began = perf_counter()
+                    warm_up_templates()
+                    warm_up = perf_counter() - began
+                    results[profile] = {
+                        name: self.measure(
+                            name, context, request, options['repeat']
+                        )
+                        for name, context in contexts.items()
+                    }
+                self.stdout.write(
+                    f'{profile}: прогрев {warm_up * 1000:.1f} мс'
+                )
+        cold, warm = results.values()
+        self.stdout.write(
+            f'{"шаблон, мс":<26} {"без кэша":>9} {"cached":>9} '
+            f'{"разбор":>9}'
+        )
+        for name in contexts:
+            self.stdout.write(
+                f'{name:<26} {cold[name]:>9.3f} {warm[name]:>9.3f} '
+                f'{cold[name] - warm[name]:>9.3f}'
+            )
+        total_cold, total_warm = sum(cold.values()), sum(warm.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Разбор занимает {(total_cold - total_warm) / total_cold:.0%} '
+            f'времени рендера без кэша'
+        ))
+
+    def measure(self, name, context, request, repeat):
+        """Среднее время ``get_template`` и рендера в миллисекундах."""
+        total = 0.0
+        for _ in range(repeat):
+            # Карточки и фрагменты {% cache %} рендерятся каждый раз
+            cache.clear()
+            began = perf_counter()
+            get_template(name).render(context, request)
+            total += perf_counter() - began
+        return total / repeat * 1000
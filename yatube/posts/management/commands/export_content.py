@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.transfer import export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в JSON Lines (по объекту на строку) потоком, не загружая базу '
+        'в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки; «-» — стандартный вывод',
+        )
+
+    def handle(self, *args, path, **options):
+        if path == '-':
+            self.write(self.stdout)
+            return
+        with open(path, 'w', encoding='utf-8') as out:
+            total = self.write(out)
+        self.stderr.write(self.style.SUCCESS(f'Выгружено строк: {total}'))
+
+    def write(self, out):
+        total = 0
+        for line in export_lines():
+            out.write(line + '\n')
+            total += 1
+        return total
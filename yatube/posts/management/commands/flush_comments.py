@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import comment_queue
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит в базу комментарии из очереди отложенной записи. '
+        'Нужна после остановки процесса, чей фоновый поток не успел '
+        'перенести очередь; уже вставленные комментарии пропускаются.'
+    )
+
+    def handle(self, *args, **options):
+        total = comment_queue.flush()
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено комментариев: {total}'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры POST_THUMBNAILS для всех постов с картинками, '
+        'например для постов, загруженных до включения фоновой генерации.'
+    )
+
+    def handle(self, *args, **options):
+        post_ids = Post.objects.exclude(image='').values_list('id', flat=True)
+        total = 0
+        for post_id in post_ids.iterator():
+            thumbnails.generate(post_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано постов: {total}'))
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import BATCH_SIZE, TransferError, import_lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает дамп export_content: читает JSON Lines потоком и '
+        'вставляет объекты пачками bulk_create, затем пересчитывает '
+        'счётчики и ленты.'
+    )
+    stealth_options = ('stdin',)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл дампа; «-» — стандартный ввод',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Объектов в одной вставке и транзакции',
+        )
+
+    def handle(self, *args, path, batch_size, **options):
+        try:
+            if path == '-':
+                stdin = options.get('stdin', sys.stdin)
+                totals = import_lines(stdin, batch_size, self.progress)
+            else:
+                with open(path, encoding='utf-8') as lines:
+                    totals = import_lines(lines, batch_size, self.progress)
+        except TransferError as error:
+            raise CommandError(error)
+        summary = ', '.join(f'{kind}: {total}' for kind, total in
+                            totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Загружено — {summary}'))
+
+    def progress(self, kind, total, rate):
+        self.stderr.write(f'{kind}: {total} ({rate:.0f} объектов/с)')
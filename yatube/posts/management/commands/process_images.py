@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts import images
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Перекодирует картинки постов в WebP с ограничением размера и '
+        'строит миниатюры. По умолчанию обрабатывает только картинки без '
+        'записанных размеров, то есть загруженные до перекодировки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать все картинки заново',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(image_width__isnull=True)
+        total = 0
+        for post_id in posts.values_list('id', flat=True).iterator():
+            images.process(post_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано постов: {total}'))
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+
+from posts import budget
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет временную базу данными, открывает каждую страницу posts '
+        'и проверяет бюджет запросов; p50/p95 времени ответа пишутся в '
+        'JSON-отчёт, который можно сравнить с отчётом другого коммита.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--report', help='куда записать JSON-отчёт')
+        parser.add_argument('--compare', help='JSON-отчёт для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        # Замер идёт на отдельных тестовых базах: рабочие данные не
+        # трогаем, а реплики, как в тестах, смотрят в тестовую основную
+        old_config = setup_databases(
+            verbosity=0, interactive=False, aliases=list(connections)
+        )
+        try:
+            budget.seed(
+                users=options['users'],
+                posts=options['posts'],
+                comments=options['comments'],
+                follows=options['follows'],
+                groups=options['groups'],
+            )
+            report = budget.run(repeat=options['repeat'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+        for name, row in report.items():
+            self.stdout.write(
+                f'{name:<24} запросов {row["queries"]:>3} '
+                f'(бюджет {row["budget"]}), p50 {row["p50_ms"]} мс, '
+                f'p95 {row["p95_ms"]} мс'
+            )
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        problems = budget.over_budget(report)
+        if baseline is not None:
+            problems += budget.regressions(
+                report, baseline, options['tolerance']
+            )
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f'Проблем найдено: {len(problems)}')
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_group_counters(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    group_posts = Post.objects.filter(group=OuterRef('id')).order_by()
+    Group.objects.update(
+        posts_count=Coalesce(
+            Subquery(
+                group_posts.values('group')
+                .annotate(total=Count('id'))
+                .values('total')
+            ),
+            0,
+        ),
+        last_post_at=Subquery(
+            group_posts.order_by('-created').values('created')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число постов'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата последнего поста'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['last_post_at'], name='posts_group_last_post'),
+        ),
+        migrations.RunPython(
+            populate_group_counters, migrations.RunPython.noop
+        ),
+    ]
@@ -1,10 +1,35 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 
-class Group(models.Model):
+class AtomicSaveMixin:
+    """save() и обработчики post_save выполняются в одной транзакции."""
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class LoadedValuesMixin:
+    """Запоминает значения полей, прочитанные из базы.
+
+    Нужно обработчикам сигналов: при переносе поста в другую группу или
+    смене slug группы надо сбросить кэш и по старому значению.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def loaded_value(self, attname):
+        return getattr(self, '_loaded_values', {}).get(attname)
+
+
+class Group(LoadedValuesMixin, models.Model):
     title = models.CharField(
         max_length=200,
         verbose_name='название',
@@ -17,15 +42,32 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='описание',
     )
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+        editable=False,
+    )
+    last_post_at = models.DateTimeField(
+        'Дата последнего поста',
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Группа'
+        # Каталог групп: свежие сверху, порядок берётся из индекса
+        indexes = (
+            models.Index(
+                fields=('last_post_at',), name='posts_group_last_post'
+            ),
+        )
 
     def __str__(self):
         return f'{self.title}'
 
 
-class Post(models.Model):
+class Post(AtomicSaveMixin, LoadedValuesMixin, models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Введите текст поста',
@@ -52,22 +94,79 @@ class Post(models.Model):
         blank=True,
         help_text='вы можете вставить картинку'
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    # JSON: имя картинки и имена её миниатюр по геометрии (posts.thumbnails)
+    thumbnails = models.TextField(
+        'Миниатюры',
+        blank=True,
+        default='',
+        editable=False,
+    )
     created = models.DateTimeField(
         'Дата создания',
         auto_now_add=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
+    version = models.PositiveIntegerField(
+        'Версия карточки',
+        default=1,
+        editable=False,
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
 
     class Meta:
         ordering = ('-created',)
         default_related_name = 'posts'
         verbose_name = 'пост'
         verbose_name_plural = 'Посты'
+        # Индексы по возрастанию: SQLite читает их с конца, и неявный
+        # rowid в хвосте индекса даёт порядок (-created, -id) без сортировки
+        indexes = (
+            models.Index(fields=('created',), name='posts_post_created'),
+            models.Index(
+                fields=('author', 'created'), name='posts_post_author_created'
+            ),
+            models.Index(
+                fields=('group', 'created'), name='posts_post_group_created'
+            ),
+        )
 
     def __str__(self):
         return f'{self.text[:15]}'
 
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using')
+        with transaction.atomic(using=using):
+            if self.pk is not None and not self._state.adding:
+                # Новая версия сбрасывает закэшированную карточку поста.
+                # Обработчики post_save должны видеть её числом, поэтому
+                # версия растёт отдельным UPDATE до сохранения
+                Post.objects.using(using).filter(pk=self.pk).update(
+                    version=models.F('version') + 1
+                )
+                self.refresh_from_db(using=using, fields=('version',))
+            super().save(*args, **kwargs)
+
 
-class Comment(models.Model):
+class Comment(AtomicSaveMixin, models.Model):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -91,8 +190,15 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created'), name='posts_comment_post_created'
+            ),
+        )
+
 
-class Follow(models.Model):
+class Follow(AtomicSaveMixin, models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name="follower",
@@ -101,3 +207,70 @@ class Follow(models.Model):
         User, on_delete=models.CASCADE,
         related_name="following",
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='posts_follow_unique'
+            ),
+        )
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'{self.user_id}'
+
+
+class FeedEntry(models.Model):
+    """Материализованная лента подписок: строка на пару (читатель, пост)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    created = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('user', 'created'), name='posts_feed_user_created'
+            ),
+            models.Index(
+                fields=('user', 'author'), name='posts_feed_user_author'
+            ),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='posts_feed_unique_entry'
+            ),
+        )
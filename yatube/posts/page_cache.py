@@ -0,0 +1,139 @@
+"""Кэш целых страниц для анонимных GET-запросов с тегами.
+
+Каждая закэшированная страница помечена тегами (``index``,
+``group:<slug>``, ``profile:<username>``). У тега есть версия в кэше, и
+ключ страницы строится из пути, параметров и версий её тегов. Сброс
+тега меняет его версию: старые страницы больше не читаются и просто
+истекают по таймауту, а страницы с другими тегами остаются в кэше.
+
+Закэшированная страница хранится вместе с ``ETag`` — хэшем тела. Ключ
+считается по версиям тегов без запросов к базе, поэтому на совпадающий
+``If-None-Match`` ответ 304 уходит после одного чтения кэша, не вызывая
+view. Хэш тела, а не версии тегов, нужен потому, что не всё на странице
+сбрасывает теги: число комментариев в карточке обновится только после
+истечения страницы. Анонимные ответы помечены ``public`` с
+``s-maxage`` для обратного прокси, остальные — ``private``; всем нужен
+``Vary: Cookie``.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+    quote_etag,
+)
+
+from core import metrics
+from yatube.settings import (
+    PAGE_CACHE_INDEX_PAGES, PAGE_CACHE_TIMEOUT, PAGE_PROXY_MAX_AGE,
+)
+
+INDEX_TAG = 'index'
+GROUPS_TAG = 'groups'
+
+
+def group_tag(slug):
+    return f'group:{slug}'
+
+
+def profile_tag(username):
+    return f'profile:{username}'
+
+
+def _tag_key(tag):
+    return f'pagetag:{tag}'
+
+
+def _new_version():
+    # Время в наносекундах не повторяется даже после вытеснения тега
+    return time.time_ns()
+
+
+def tag_versions(tags):
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*tags):
+    cache.set_many({_tag_key(tag): _new_version() for tag in tags}, None)
+
+
+def page_key(request, tags):
+    raw = '|'.join(
+        [request.path, request.GET.urlencode()]
+        + [f'{tag}={version}' for tag, version
+           in zip(tags, tag_versions(tags))]
+    )
+    return 'page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def index_tags(request):
+    """Сбрасываются только первые страницы главной, глубокие истекают."""
+    page = request.GET.get('page', '1')
+    if 'cursor' in request.GET:
+        return ()
+    if page.isdigit() and int(page) > PAGE_CACHE_INDEX_PAGES:
+        return ()
+    return (INDEX_TAG,)
+
+
+def _etag(content):
+    return quote_etag(hashlib.md5(content).hexdigest())
+
+
+def _shared(response):
+    # max-age=0: браузер каждый раз переспрашивает с If-None-Match
+    patch_cache_control(
+        response, public=True, max_age=0, s_maxage=PAGE_PROXY_MAX_AGE
+    )
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _private(response):
+    patch_cache_control(response, private=True, max_age=0)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _not_modified(request, etag):
+    response = get_conditional_response(request, etag=etag)
+    if response is not None and response.status_code == 304:
+        response['ETag'] = etag
+        return _shared(response)
+    return None
+
+
+def cache_anonymous_page(tags):
+    """Кэширует ответ view для анонимов; ``tags(request, **kwargs)``."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return _private(view(request, *args, **kwargs))
+            key = page_key(request, tags(request, *args, **kwargs))
+            response = cache.get(key)
+            if response is not None:
+                metrics.record_cache('pages', hits=1)
+                return _not_modified(request, response['ETag']) or response
+            metrics.record_cache('pages', misses=1)
+            response = view(request, *args, **kwargs)
+            if (
+                response.status_code == 200
+                and not response.cookies
+                # В странице с CSRF-токеном он свой у каждого посетителя
+                and not request.META.get('CSRF_COOKIE_USED')
+            ):
+                response['ETag'] = _etag(response.content)
+                cache.set(key, _shared(response), PAGE_CACHE_TIMEOUT)
+                return _not_modified(request, response['ETag']) or response
+            return _private(response)
+        return wrapper
+    return decorator
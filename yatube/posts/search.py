@@ -0,0 +1,353 @@
+"""Полнотекстовый поиск по постам.
+
+Основной движок — виртуальная таблица SQLite FTS5 с внешним содержимым
+(``posts_post``), которую синхронизируют триггеры на вставку, правку и
+удаление поста. Таблица и триггеры создаются после ``migrate``: SQLite
+пересоздаёт таблицу постов при изменении её схемы, и триггеры при этом
+теряются. Если FTS5 недоступен (другая СУБД или сборка SQLite без
+модуля), используется обратный индекс в памяти процесса.
+
+Результаты упорядочены по релевантности (bm25) и листаются курсором по
+паре ``(релевантность, id)``.
+"""
+import base64
+import binascii
+import bisect
+import json
+import math
+import re
+import threading
+from collections import Counter, defaultdict, namedtuple
+
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_TOKENS = 16
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+SearchResult = namedtuple('SearchResult', 'post snippet')
+
+
+class SearchPage:
+    def __init__(self, results, next_cursor):
+        self.results = results
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.lower())
+
+
+def encode_cursor(score, post_id):
+    raw = json.dumps([score, post_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        score, post_id = json.loads(
+            base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        )
+        return float(score), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+class Fts5Backend:
+    """Поиск средствами SQLite FTS5; индекс ведут триггеры в базе."""
+
+    table = FTS_TABLE
+
+    @staticmethod
+    def match_expression(query):
+        # Каждое слово в кавычках: пользовательский ввод не может
+        # сломать синтаксис MATCH; звёздочка ищет и по началу слова
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, query, after=None, limit=10):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        sql = (
+            f'SELECT rowid, bm25({self.table}), '
+            f"snippet({self.table}, 0, char(2), char(3), '…', "
+            f'{SNIPPET_TOKENS}) '
+            f'FROM {self.table} WHERE {self.table} MATCH %s'
+        )
+        params = [match]
+        if after is not None:
+            sql += (
+                f' AND (bm25({self.table}) > %s OR '
+                f'(bm25({self.table}) = %s AND rowid > %s))'
+            )
+            params += [after[0], after[0], after[1]]
+        sql += f' ORDER BY bm25({self.table}), rowid LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def filter_queryset(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            (match,),
+        ))
+
+    def post_saved(self, post):
+        pass
+
+    def post_deleted(self, post_id):
+        pass
+
+    def reset(self):
+        pass
+
+
+class InvertedIndexBackend:
+    """Обратный индекс в памяти процесса: слово -> {id поста: частота}.
+
+    Строится из базы при первом поиске и обновляется сигналами. Ранжирует
+    по TF-IDF; оценки отрицательные, чтобы, как у bm25, меньше было лучше.
+    Слова хранятся ещё и отсортированным списком: слова с префиксом
+    запроса — непрерывный диапазон, который находит ``bisect``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._vocabulary = []
+        self._texts = {}
+
+    def _build(self):
+        postings = defaultdict(dict)
+        texts = {}
+        for post_id, text in Post.objects.values_list('id', 'text').iterator():
+            texts[post_id] = text
+            for token, frequency in Counter(tokenize(text)).items():
+                postings[token][post_id] = frequency
+        self._postings, self._texts = postings, texts
+        self._vocabulary = sorted(postings)
+
+    def _ensure(self):
+        if self._postings is None:
+            self._build()
+
+    def _remove(self, post_id):
+        text = self._texts.pop(post_id, None)
+        if text is None:
+            return
+        for token in set(tokenize(text)):
+            self._postings[token].pop(post_id, None)
+            if not self._postings[token]:
+                del self._postings[token]
+                del self._vocabulary[
+                    bisect.bisect_left(self._vocabulary, token)
+                ]
+
+    def reset(self):
+        """Забывает индекс; он перестроится при следующем поиске."""
+        with self._lock:
+            self._postings, self._texts = None, {}
+            self._vocabulary = []
+
+    def post_saved(self, post):
+        with self._lock:
+            if self._postings is None:
+                return
+            self._remove(post.id)
+            self._texts[post.id] = post.text
+            for token, frequency in Counter(tokenize(post.text)).items():
+                if token not in self._postings:
+                    bisect.insort(self._vocabulary, token)
+                self._postings[token][post.id] = frequency
+
+    def post_deleted(self, post_id):
+        with self._lock:
+            if self._postings is not None:
+                self._remove(post_id)
+
+    def _prefixed(self, token):
+        vocabulary = self._vocabulary
+        for index in range(
+            bisect.bisect_left(vocabulary, token), len(vocabulary)
+        ):
+            if not vocabulary[index].startswith(token):
+                break
+            yield vocabulary[index]
+
+    def _matches(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return {}
+        total = len(self._texts) or 1
+        scores = None
+        for token in tokens:
+            postings = {}
+            for word in self._prefixed(token):
+                for post_id, frequency in self._postings[word].items():
+                    postings[post_id] = postings.get(post_id, 0) + frequency
+            idf = math.log(1 + total / (len(postings) or 1))
+            token_scores = {
+                post_id: -frequency * idf
+                for post_id, frequency in postings.items()
+            }
+            scores = token_scores if scores is None else {
+                post_id: score + token_scores[post_id]
+                for post_id, score in scores.items()
+                if post_id in token_scores
+            }
+        return scores
+
+    def _snippet(self, text, tokens):
+        words = text.split()
+        hit = next(
+            (index for index, word in enumerate(words)
+             if any(token in word.lower() for token in tokens)),
+            0,
+        )
+        start = max(hit - SNIPPET_TOKENS // 2, 0)
+        chosen = [
+            f'{MARK_START}{word}{MARK_END}'
+            if any(token in word.lower() for token in tokens) else word
+            for word in words[start:start + SNIPPET_TOKENS]
+        ]
+        prefix = '…' if start else ''
+        suffix = '…' if start + SNIPPET_TOKENS < len(words) else ''
+        return prefix + ' '.join(chosen) + suffix
+
+    def search(self, query, after=None, limit=10):
+        with self._lock:
+            self._ensure()
+            ranked = sorted(
+                (score, post_id)
+                for post_id, score in self._matches(query).items()
+            )
+            if after is not None:
+                ranked = [row for row in ranked if row > after]
+            tokens = tokenize(query)
+            return [
+                (post_id, score, self._snippet(self._texts[post_id], tokens))
+                for score, post_id in ranked[:limit]
+            ]
+
+    def filter_queryset(self, queryset, query):
+        with self._lock:
+            self._ensure()
+            return queryset.filter(pk__in=list(self._matches(query)))
+
+
+_backend = None
+
+
+def fts5_available(db=connection):
+    if db.vendor != 'sqlite':
+        return False
+    # Проверяем модуль на отдельной базе в памяти, не трогая рабочую
+    probe = db.Database.connect(':memory:')
+    try:
+        probe.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+    except db.Database.OperationalError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        _backend = Fts5Backend() if fts5_available() else (
+            InvertedIndexBackend()
+        )
+    return _backend
+
+
+def install(using='default', **kwargs):
+    """Создаёт таблицу FTS5 и триггеры, если их ещё нет (post_migrate)."""
+    db = connections[using]
+    if not fts5_available(db):
+        return
+    post_table = Post._meta.db_table
+    triggers = {
+        f'{FTS_TABLE}_ai': (
+            f'AFTER INSERT ON {post_table} BEGIN '
+            f'INSERT INTO {FTS_TABLE}(rowid, text) '
+            f'VALUES (new.id, new.text); END'
+        ),
+        f'{FTS_TABLE}_ad': (
+            f'AFTER DELETE ON {post_table} BEGIN '
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+            f"VALUES ('delete', old.id, old.text); END"
+        ),
+        f'{FTS_TABLE}_au': (
+            f'AFTER UPDATE OF text ON {post_table} BEGIN '
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+            f"VALUES ('delete', old.id, old.text); "
+            f'INSERT INTO {FTS_TABLE}(rowid, text) '
+            f'VALUES (new.id, new.text); END'
+        ),
+    }
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f"text, content='{post_table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        for name, body in triggers.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+        if not existing.issuperset(triggers):
+            # Пока триггеров не было, индекс мог разойтись с таблицей
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+            )
+
+
+def search(query, cursor=None, limit=10):
+    """Страница результатов поиска: посты, фрагменты и курсор дальше."""
+    rows = backend().search(query, decode_cursor(cursor), limit + 1)
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [row[0] for row in rows[:limit]]
+    )
+    results = [
+        SearchResult(posts[post_id], highlight(snippet))
+        for post_id, score, snippet in rows[:limit]
+        if post_id in posts
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        post_id, score, _ = rows[limit - 1]
+        next_cursor = encode_cursor(score, post_id)
+    return SearchPage(results, next_cursor)
@@ -0,0 +1,61 @@
+"""Сериализация для JSON API: словари собираются вручную.
+
+Поля перечислены явно, без обхода ``_meta`` и без DRF: сериализатор
+страницы ленты — это десяток обращений к атрибутам на пост.
+"""
+
+
+def author_json(user):
+    return {
+        'username': user.username,
+        'full_name': user.get_full_name(),
+    }
+
+
+def group_json(group):
+    if group is None:
+        return None
+    return {
+        'slug': group.slug,
+        'title': group.title,
+    }
+
+
+def post_json(post):
+    return {
+        'id': post.id,
+        'text': post.text,
+        'created': post.created.isoformat(),
+        'updated': post.updated.isoformat(),
+        'author': author_json(post.author),
+        'group': group_json(post.group),
+        'image': post.image.url if post.image else None,
+        'image_width': post.image_width,
+        'image_height': post.image_height,
+        'comments_count': post.comments_count,
+    }
+
+
+def comment_json(comment):
+    return {
+        'id': comment.id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def page_json(page_obj, items):
+    """Страница ленты: курсоры keyset-паджинатора или номера страниц."""
+    if getattr(page_obj, 'is_keyset', False):
+        return {
+            'results': items,
+            'next_cursor': page_obj.next_cursor,
+            'previous_cursor': page_obj.previous_cursor,
+        }
+    return {
+        'results': items,
+        'page': page_obj.number,
+        'num_pages': page_obj.paginator.num_pages,
+        'count': page_obj.paginator.count,
+    }
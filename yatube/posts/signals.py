@@ -0,0 +1,196 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import (
+    cards, counters, feed, follows, images, page_cache, search, thumbnails,
+)
+from .groups import forget_groups
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _after_commit(func, *args):
+    # Кэш сбрасывается после коммита: иначе параллельный читатель успеет
+    # положить в него значение, собранное из ещё не изменённых данных
+    transaction.on_commit(lambda: func(*args))
+
+
+def _invalidate_pages(*tags):
+    # Сразу — чтобы откаченная запись тоже сбросила страницы, и ещё раз
+    # после коммита — против читателя, успевшего закэшировать старое
+    page_cache.invalidate(*tags)
+    _after_commit(page_cache.invalidate, *tags)
+
+
+def _author_fields_changed(update_fields):
+    return update_fields is None or cards.AUTHOR_CARD_FIELDS & update_fields
+
+
+def _post_groups(post):
+    """Текущая и прежняя группы поста: ``{id: slug}``."""
+    group_ids = {post.group_id, post.loaded_value('group_id')} - {None}
+    return dict(
+        Group.objects.filter(id__in=group_ids).values_list('id', 'slug')
+    )
+
+
+def _post_page_tags(post, slugs):
+    return [
+        page_cache.INDEX_TAG,
+        page_cache.profile_tag(post.author.username),
+        *map(page_cache.group_tag, slugs),
+    ]
+
+
+def _groups_changed(deltas, slugs):
+    deltas = {
+        group_id: delta for group_id, delta in deltas.items()
+        if group_id is not None
+    }
+    if not deltas:
+        return []
+    counters.groups_changed(deltas)
+    _after_commit(
+        forget_groups, *(slugs[group_id] for group_id in deltas)
+    )
+    return [page_cache.GROUPS_TAG]
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw and _author_fields_changed(
+        kwargs.get('update_fields')
+    ):
+        instance._old_username = User.objects.filter(
+            pk=instance.pk
+        ).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+        _invalidate_pages(page_cache.profile_tag(instance.username))
+    elif _author_fields_changed(kwargs.get('update_fields')):
+        cards.bump_versions(author=instance)
+        usernames = {
+            instance.username, getattr(instance, '_old_username', None)
+        }
+        _invalidate_pages(
+            page_cache.INDEX_TAG,
+            *(page_cache.profile_tag(name) for name in usernames - {None}),
+        )
+
+
+def _group_slugs(group):
+    return {group.slug, group.loaded_value('slug')} - {None}
+
+
+def _group_page_tags(group):
+    return [
+        page_cache.INDEX_TAG,
+        page_cache.GROUPS_TAG,
+        *map(page_cache.group_tag, _group_slugs(group)),
+    ]
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _invalidate_pages(page_cache.GROUPS_TAG)
+        return
+    cards.bump_versions(group=instance)
+    _after_commit(forget_groups, *_group_slugs(instance))
+    _invalidate_pages(*_group_page_tags(instance))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # Посты группы останутся без неё (SET_NULL) — их карточки устарели
+    cards.bump_versions(group=instance)
+    _after_commit(forget_groups, *_group_slugs(instance))
+    _invalidate_pages(*_group_page_tags(instance))
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.user_changed(instance.author_id, 'posts_count', 1)
+        feed.fan_out(instance)
+    slugs = _post_groups(instance)
+    previous = None if created else instance.loaded_value('group_id')
+    tags = _post_page_tags(instance, slugs.values())
+    if previous != instance.group_id:
+        tags += _groups_changed(
+            {previous: -1, instance.group_id: 1}, slugs
+        )
+    _invalidate_pages(*tags)
+    # Повторное сохранение того же объекта не должно снова сдвинуть счётчик
+    instance._loaded_values = {
+        **getattr(instance, '_loaded_values', {}),
+        'group_id': instance.group_id,
+    }
+    if thumbnails.image_changed(instance, created):
+        images.schedule(instance)
+    search.backend().post_saved(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.user_changed(instance.author_id, 'posts_count', -1)
+    slugs = _post_groups(instance)
+    _invalidate_pages(
+        *_post_page_tags(instance, slugs.values()),
+        *_groups_changed({instance.group_id: -1}, slugs),
+    )
+    search.backend().post_deleted(instance.id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.post_comments_changed(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.post_comments_changed(instance.post_id, -1)
+
+
+def _invalidate_follow_profiles(follow):
+    # На профилях обоих пользователей выводятся счётчики подписок
+    _invalidate_pages(*(
+        page_cache.profile_tag(username) for username in
+        User.objects.filter(
+            id__in=(follow.user_id, follow.author_id)
+        ).values_list('username', flat=True)
+    ))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.user_changed(instance.user_id, 'following_count', 1)
+        counters.user_changed(instance.author_id, 'followers_count', 1)
+        feed.refresh_celebrity(instance.author_id, followed=True)
+        feed.backfill(instance.user_id, instance.author_id)
+        _after_commit(follows.forget, instance.user_id)
+        _invalidate_follow_profiles(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.user_changed(instance.user_id, 'following_count', -1)
+    counters.user_changed(instance.author_id, 'followers_count', -1)
+    feed.refresh_celebrity(instance.author_id, followed=False)
+    feed.prune(instance.user_id, instance.author_id)
+    _after_commit(follows.forget, instance.user_id)
+    _invalidate_follow_profiles(instance)
@@ -0,0 +1,77 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Анна', last_name='Ахматова')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Стихи', slug='poems')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Сероглазый король')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.post = Post.objects.get(pk=self.post.pk)
+
+    def test_feeds(self):
+        """Ленты отдают посты в JSON с автором и группой"""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group', args=('poems',)),
+            reverse('posts:api_profile', args=('writer',)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                post, = data['results']
+                self.assertEqual(post['id'], self.post.id)
+                self.assertEqual(post['author']['full_name'], 'Анна Ахматова')
+                self.assertEqual(post['group']['slug'], 'poems')
+        data = self.client.get(urls[2]).json()
+        self.assertEqual(data['author']['posts_count'], 1)
+
+    def test_etag(self):
+        """Неизменная лента отдаёт 304, правка и комментарий меняют ETag"""
+        url = reverse('posts:api_index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.post.text = 'Слава тебе, безысходная боль'
+        self.post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        Comment.objects.create(post=self.post, author=self.reader, text='!')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_last_modified(self):
+        """Без Last-Modified новый комментарий не спрятать за 304"""
+        url = reverse('posts:api_post', args=(self.post.id,))
+        response = self.client.get(url)
+        self.assertEqual(response.json()['text'], 'Сероглазый король')
+        self.assertFalse(response.has_header('Last-Modified'))
+        Comment.objects.create(post=self.post, author=self.reader, text='!')
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 2099 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comments_count'], 1)
+
+    def test_follow_requires_login(self):
+        """Лента подписок без входа отдаёт 401, а не редирект"""
+        url = reverse('posts:api_follow')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']],
+            [self.post.id],
+        )
+        self.assertIn('Cookie', response['Vary'])
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import User
+from yatube import settings
+
+
+class CachedAuthTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='cached', password='old-secret-42'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('about:author')
+
+    def test_sessions_and_user_from_cache(self):
+        """Повторный запрос не читает из базы ни сессию, ни пользователя"""
+        self.assertEqual(
+            settings.SESSION_ENGINE, settings.SESSION_ENGINES['cached_db']
+        )
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.context['user'], self.user)
+        self.assertEqual(second.context['user'].username, 'cached')
+        self.assertTrue(second.context['user'].is_authenticated)
+
+    def test_password_change_invalidates(self):
+        """После смены пароля закэшированный пользователь не пускает"""
+        self.client.get(self.url)
+        user = User.objects.get(id=self.user.id)
+        user.set_password('new-secret-42')
+        user.save()
+        response = self.client.get(self.url)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_password_change_view_keeps_session(self):
+        """Смена пароля через форму не разлогинивает сменившего"""
+        self.client.get(self.url)
+        self.client.post(reverse('users:password_change'), {
+            'old_password': 'old-secret-42',
+            'new_password1': 'new-secret-42',
+            'new_password2': 'new-secret-42',
+        })
+        response = self.client.get(self.url)
+        self.assertTrue(response.context['user'].is_authenticated)
+        self.assertTrue(
+            response.context['user'].check_password('new-secret-42')
+        )
@@ -0,0 +1,30 @@
+from django.test import TestCase
+
+from posts import budget
+from posts.urls import urlpatterns
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        budget.seed(users=30, posts=120, comments=300, follows=60, groups=3)
+
+    def test_routes_within_query_budget(self):
+        """Каждая страница укладывается в бюджет запросов"""
+        routes = budget.sample_routes()
+        names = {f'posts:{pattern.name}' for pattern in urlpatterns}
+        self.assertEqual({route.name for route in routes}, names)
+        self.assertEqual(set(budget.QUERY_BUDGETS), names)
+        for route in routes:
+            with self.subTest(route=route.name):
+                row = budget.measure(route, repeat=2)
+                self.assertLess(row['status'], 400)
+                self.assertLessEqual(row['queries'], row['budget'])
+
+    def test_regressions(self):
+        """Сравнение отчётов находит рост запросов и времени"""
+        baseline = {'posts:index': {'queries': 4, 'p95_ms': 10.0}}
+        report = {'posts:index': {'queries': 5, 'p95_ms': 13.0}}
+        self.assertEqual(len(budget.regressions(report, baseline)), 2)
+        self.assertEqual(budget.regressions(baseline, baseline), [])
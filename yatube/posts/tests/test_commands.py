@@ -0,0 +1,105 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import feed
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class AuditIndexesCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='audit',
+            description='Описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(3):
+            post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Пост {number}',
+            )
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий'
+            )
+
+    def test_audit_indexes(self):
+        """Запросы всех страниц обходятся без полного просмотра таблиц"""
+        out = StringIO()
+        call_command('audit_indexes', stdout=out, stderr=out)
+        self.assertIn('Все запросы используют индексы', out.getvalue())
+
+
+class TransferCommandsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='transfer')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Первый пост')
+        Post.objects.create(author=cls.reader, text='Второй пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+
+    def test_export_and_import(self):
+        """Выгрузка загружается в пустую базу со связями и датами"""
+        dump = StringIO()
+        call_command('export_content', stdout=dump)
+        created = self.post.created
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        out = StringIO()
+        call_command(
+            'import_content', '--batch-size=1',
+            stdin=StringIO(dump.getvalue()), stdout=out, stderr=out,
+        )
+        self.assertEqual(User.objects.count(), 2)
+        post = Post.objects.get(text='Первый пост')
+        self.assertEqual(post.created, created)
+        self.assertEqual(post.group.slug, 'transfer')
+        self.assertEqual(post.author.get_full_name(), 'Лев Толстой')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().author.username, 'reader')
+        reader = User.objects.get(username='reader')
+        self.assertEqual(list(feed.feed_posts(reader)), [post])
+        self.assertEqual(reader.stats.following_count, 1)
+        self.assertIn('post: 2', out.getvalue())
+
+    def test_import_twice(self):
+        """Повторная загрузка того же дампа не дублирует записи"""
+        dump = StringIO()
+        call_command('export_content', stdout=dump)
+        call_command(
+            'import_content', stdin=StringIO(dump.getvalue()),
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_bad_date(self):
+        """Некорректная дата сообщает номер строки"""
+        lines = (
+            '{"type": "post", "id": 1, "author": "author", '
+            '"text": "Пост", "created": "вчера"}\n'
+        )
+        with self.assertRaisesMessage(CommandError, 'Строка 1'):
+            call_command('import_content', stdin=StringIO(lines))
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_unknown_reference(self):
+        """Ссылка на неизвестного автора прерывает импорт с ошибкой"""
+        line = '{"type": "follow", "user": "nobody", "author": "author"}\n'
+        with self.assertRaisesMessage(CommandError, 'nobody'):
+            call_command('import_content', stdin=StringIO(line))
@@ -1,8 +1,26 @@
-from django.test import Client, TestCase
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from posts import images
 from posts.models import Group, Post, User
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_upload(size=(40, 20), image_format='JPEG', name='photo.jpg',
+                **params):
+    content = io.BytesIO()
+    Image.new('RGB', size, 'red').save(content, image_format, **params)
+    return SimpleUploadedFile(name, content.getvalue())
+
 
 class PostCreateFormTests(TestCase):
     @classmethod
@@ -92,3 +110,64 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(
             len(response.context.get('page_obj').object_list), 0)
         self.assertEqual(count_posts_1, count_posts_2)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create(self, upload):
+        return self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'С картинкой', 'image': upload},
+        )
+
+    def test_dimensions_recorded(self):
+        """Размеры картинки записываются в пост при загрузке"""
+        self.create(make_upload((40, 20)))
+        post = Post.objects.get(author=self.user)
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+
+    def test_rejected_uploads(self):
+        """Слишком большие файлы, картинки и чужие форматы отклоняются"""
+        limits = {
+            'IMAGE_MAX_UPLOAD_SIZE': 10,
+            'IMAGE_MAX_PIXELS': 100,
+            'IMAGE_FORMATS': ('PNG',),
+        }
+        for setting, value in limits.items():
+            with self.subTest(setting=setting):
+                with mock.patch.object(images, setting, value):
+                    response = self.create(make_upload())
+                self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    def test_process(self):
+        """Фоновая обработка уменьшает картинку, убирает EXIF и пишет WebP"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        self.create(make_upload((400, 100), exif=exif.tobytes()))
+        post = Post.objects.get(author=self.user)
+        original = post.image.path
+        with mock.patch.object(images, 'IMAGE_MAX_SIDE', 100):
+            images.process(post.id)
+        post.refresh_from_db()
+        self.assertTrue(post.image.name.endswith('.webp'))
+        self.assertEqual((post.image_width, post.image_height), (100, 25))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (100, 25))
+            self.assertFalse(image.getexif())
+        with self.assertRaises(FileNotFoundError):
+            open(original)
@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core import views
+from core.metrics import parse, registry, summary
+from posts.models import Post, User
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='measured')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        patcher = mock.patch.object(views, 'METRICS_TOKEN', 'secret')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scrape(self, **extra):
+        return self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret', **extra)
+
+    def metrics(self):
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        return summary(parse(response.content.decode()))
+
+    def test_view_metrics(self):
+        """Метрики считаются по view: время, запросы, рендер и кэш"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        rows, overhead = self.metrics()
+        index = rows['posts:index']
+        self.assertEqual(index['requests'], 2)
+        self.assertGreater(index['queries'], 0)
+        self.assertGreater(index['template_ms'], 0)
+        # Вторая страница взята из кэша страниц
+        self.assertGreater(index['cache_hits'], 0)
+        self.assertLess(overhead, 1)
+
+    def test_prometheus_format(self):
+        """Гистограммы отдаются накопленными ячейками до +Inf"""
+        self.client.get(reverse('posts:index'))
+        text = self.scrape().content.decode()
+        self.assertIn('# TYPE yatube_request_seconds histogram', text)
+        self.assertIn(
+            'yatube_db_queries_bucket{view="posts:index",le="+Inf"} 1', text)
+
+    def test_forbidden_without_token(self):
+        """Страница метрик закрыта без токена, даже для 127.0.0.1"""
+        for headers in (
+            {},
+            {'HTTP_AUTHORIZATION': 'Bearer other'},
+        ):
+            with self.subTest(headers=headers):
+                response = self.client.get(
+                    reverse('metrics'), REMOTE_ADDR='127.0.0.1', **headers)
+                self.assertEqual(response.status_code, 403)
+        with mock.patch.object(views, 'METRICS_TOKEN', ''):
+            response = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 403)
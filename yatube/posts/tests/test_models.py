@@ -1,6 +1,8 @@
+from django.db.models.signals import post_save
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..counters import recount, stats_for
+from ..models import Comment, Follow, Group, Post, User, UserStats
 
 
 class PostModelTest(TestCase):
@@ -25,3 +27,123 @@ class PostModelTest(TestCase):
     def test_post_have_correct_object_names(self):
         """Проверяем, что у поста корректно работает __str__."""
         self.assertEqual(self.post.text[:15], str(self.post))
+
+    def test_version_is_number_in_post_save(self):
+        """Обработчики post_save видят новую версию поста числом"""
+        seen = []
+
+        def receiver(sender, instance, **kwargs):
+            seen.append(instance.version)
+
+        post = Post.objects.get(id=self.post.id)
+        post_save.connect(receiver, sender=Post)
+        self.addCleanup(post_save.disconnect, receiver, sender=Post)
+        post.save()
+        post.save(update_fields=('text',))
+        self.assertEqual(seen, [2, 3])
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_recount(self):
+        """recount() чинит счётчики после массовых операций"""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {number}')
+            for number in range(3)
+        )
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        recount()
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+
+    def test_decrement_stops_at_zero(self):
+        """Разошедшийся счётчик не мешает удалению и не уходит в минус"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).update(posts_count=0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_stats_for_recounts_only_user(self):
+        """Пересчёт недостающей строки не трогает чужие посты"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        Post.objects.filter(id=post.id).update(comments_count=7)
+        UserStats.objects.filter(user=self.author).delete()
+        author = User.objects.get(id=self.author.id)
+        self.assertEqual(stats_for(author).posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 7)
+
+
+class GroupCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='group_author')
+        cls.first = Group.objects.create(title='Первая', slug='first')
+        cls.second = Group.objects.create(title='Вторая', slug='second')
+
+    def group(self, group):
+        return Group.objects.get(id=group.id)
+
+    def test_counters_follow_posts(self):
+        """Число постов и дата последнего следуют за созданием и переносом"""
+        old = Post.objects.create(
+            author=self.author, text='Старый', group=self.first
+        )
+        new = Post.objects.create(
+            author=self.author, text='Новый', group=self.first
+        )
+        self.assertEqual(self.group(self.first).posts_count, 2)
+        self.assertEqual(self.group(self.first).last_post_at, new.created)
+        new = Post.objects.get(id=new.id)
+        new.group = self.second
+        new.save()
+        first, second = self.group(self.first), self.group(self.second)
+        self.assertEqual(first.posts_count, 1)
+        self.assertEqual(first.last_post_at, old.created)
+        self.assertEqual(second.posts_count, 1)
+        self.assertEqual(second.last_post_at, new.created)
+        new.text = 'Правка без переноса'
+        new.save()
+        self.assertEqual(self.group(self.second).posts_count, 1)
+        new.delete()
+        second = self.group(self.second)
+        self.assertEqual(second.posts_count, 0)
+        self.assertIsNone(second.last_post_at)
+
+    def test_recount(self):
+        """recount() чинит счётчики групп после массовых операций"""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {number}', group=self.first)
+            for number in range(3)
+        )
+        recount()
+        first = self.group(self.first)
+        self.assertEqual(first.posts_count, 3)
+        self.assertIsNotNone(first.last_post_at)
+        self.assertEqual(self.group(self.second).posts_count, 0)
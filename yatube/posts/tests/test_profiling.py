@@ -0,0 +1,74 @@
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from core import profiling
+from posts.models import User
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='slow')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(
+            profiling, 'PROFILE_DIR', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def test_sampler_collects_stacks(self):
+        """Снимок стека содержит функции отслеживаемого потока"""
+        sampler = profiling.StackSampler(interval=1)
+        sampler.start(threading.get_ident())
+        sampler.sample()
+        stacks = sampler.stop(threading.get_ident())
+        (stack, count), = stacks.items()
+        self.assertTrue(stack.endswith(
+            'test_profiling:test_sampler_collects_stacks;profiling:sample'))
+        self.assertEqual(count, 1)
+
+    @mock.patch.object(profiling, 'PROFILE_SLOW_REQUESTS', True)
+    @mock.patch.object(profiling, 'PROFILE_THRESHOLD', 0)
+    def test_slow_request_saved(self):
+        """Стеки медленного запроса сохраняются с именем view"""
+        stacks = Counter({'views:profile;counters:stats_for': 3})
+        with mock.patch.object(
+            profiling.sampler, 'stop', return_value=stacks
+        ):
+            self.client.get(reverse('posts:profile', args=('slow',)))
+        path, = profiling.profiles()
+        self.assertIn('-posts-profile-', path)
+        self.assertEqual(profiling.read_stacks(path), stacks)
+        out = StringIO()
+        call_command('profiles', 'summary', stdout=out)
+        self.assertIn('counters:stats_for', out.getvalue())
+
+    def test_signed_header_profiles_request(self):
+        """Подписанный заголовок включает cProfile, поддельный — нет"""
+        url = reverse('posts:index')
+        self.client.get(url, HTTP_X_PROFILE='forged')
+        self.assertEqual(profiling.profiles(), [])
+        self.client.get(url, HTTP_X_PROFILE=profiling.make_token())
+        path, = profiling.profiles()
+        self.assertTrue(path.endswith(profiling.PSTATS_SUFFIX))
+        out = StringIO()
+        call_command('profiles', 'summary', stdout=out)
+        self.assertIn('cProfile: профилей 1', out.getvalue())
+
+    def test_retention(self):
+        """Хранятся только последние профили"""
+        for number in range(5):
+            profiling.save_stacks('posts:index', 1, Counter({'a': number}))
+        profiling.enforce_retention(keep=2)
+        self.assertEqual(len(profiling.profiles()), 2)
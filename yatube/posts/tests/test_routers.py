@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from core import routers, tasks
+from posts.models import Post, User
+from yatube.settings import REPLICA_PIN_COOKIE
+
+REPLICAS = ['replica1', 'replica2']
+
+
+@mock.patch.object(routers, 'DATABASE_REPLICAS', REPLICAS)
+class ReplicaRouterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+
+    def setUp(self):
+        routers.reset()
+        self.router = routers.ReplicaRouter()
+
+    def tearDown(self):
+        routers.reset()
+
+    def read_alias(self):
+        with mock.patch.object(
+            routers.connections['default'], 'in_atomic_block', False
+        ):
+            return self.router.db_for_read(Post)
+
+    def test_reads_go_to_replicas(self):
+        """Чтение уходит в реплику, запись — в основную базу"""
+        self.assertIn(self.read_alias(), REPLICAS)
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_read_after_write_uses_primary(self):
+        """После записи поток читает из основной базы"""
+        self.router.db_for_write(Post)
+        self.assertEqual(self.read_alias(), 'default')
+
+    def test_use_primary(self):
+        """Блок use_primary закрепляет чтение за основной базой"""
+        with routers.use_primary():
+            self.assertEqual(self.read_alias(), 'default')
+        self.assertIn(self.read_alias(), REPLICAS)
+
+    def test_pin_cookie_after_write(self):
+        """Запрос с записью ставит cookie, и следующий читает с основной"""
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        pin = response.cookies[REPLICA_PIN_COOKIE]
+        self.assertTrue(pin['max-age'])
+        with mock.patch.object(routers, 'pin', wraps=routers.pin) as pin:
+            self.client.get(reverse('posts:index'))
+        pin.assert_called_once_with()
+
+    def test_no_pin_cookie_for_reads(self):
+        """Запрос только с чтением cookie не ставит"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_inline_task(self):
+        """Задача без пула читает с основной базы, а её ошибка — в логе"""
+        aliases = []
+
+        def failing():
+            aliases.append(self.read_alias())
+            raise RuntimeError('сбой задачи')
+
+        with mock.patch.object(tasks, 'BACKGROUND_WORKERS', 0), \
+                self.assertLogs(tasks.logger, 'ERROR'):
+            tasks.submit(failing)
+        self.assertEqual(aliases, ['default'])
+        self.assertIn(self.read_alias(), REPLICAS)
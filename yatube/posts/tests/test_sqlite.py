@@ -0,0 +1,43 @@
+from io import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from core.sqlite import pragma_statements
+from posts.management.commands import bench_sqlite
+
+
+class PragmaStatementsTests(SimpleTestCase):
+    def test_statements(self):
+        """Настройки превращаются в PRAGMA в заданном порядке"""
+        self.assertEqual(
+            pragma_statements({'journal_mode': 'WAL', 'cache_size': -2000}),
+            ['PRAGMA journal_mode = WAL', 'PRAGMA cache_size = -2000'],
+        )
+
+    def test_rejects_injection(self):
+        """Значение с посторонним SQL отвергается"""
+        with self.assertRaises(ImproperlyConfigured):
+            pragma_statements({'synchronous': 'OFF; DROP TABLE posts_post'})
+
+
+class ConnectionPragmasTests(TestCase):
+    def test_new_connection_is_configured(self):
+        """Новое соединение получает PRAGMA из настроек базы"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            # 1 — NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class BenchReportTests(SimpleTestCase):
+    def test_report_without_latencies(self):
+        """Сценарий без замеров печатается с n/a, а не падает"""
+        out = StringIO()
+        command = bench_sqlite.Command(stdout=out)
+        command.report(
+            'wal', {'index': {'ok': 0, 'errors': 0, 'latencies': []}}, 1)
+        self.assertIn('p95 n/a', out.getvalue())
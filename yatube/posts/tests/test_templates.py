@@ -0,0 +1,33 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.template.loader import get_template
+from django.template.loaders.filesystem import Loader
+from django.test import TestCase, override_settings
+
+from core.warmup import warm_up_templates
+from yatube import settings_prod
+
+
+@override_settings(TEMPLATES=settings_prod.TEMPLATES)
+class TemplateWarmUpTests(TestCase):
+    def test_warm_up_compiles_all_templates(self):
+        """После прогрева шаблоны больше не читаются с диска"""
+        names = warm_up_templates()
+        self.assertIn('base.html', names)
+        self.assertIn('posts/includes/card_of_post.html', names)
+        with mock.patch.object(
+            Loader, 'get_contents', side_effect=AssertionError
+        ):
+            for name in names:
+                get_template(name)
+
+
+class BenchTemplatesCommandTest(TestCase):
+    def test_bench_templates(self):
+        """Замер рендера выводит строку по каждому шаблону страницы"""
+        out = StringIO()
+        call_command('bench_templates', repeat=1, stdout=out)
+        for name in ('posts/index.html', 'posts/post_detail.html'):
+            self.assertIn(name, out.getvalue())
@@ -1,21 +1,48 @@
+import base64
+import os
 import shutil
 import tempfile
+from contextlib import contextmanager
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Post, Group, Follow, User
+from core import tasks
+from posts import (
+    cards, comment_queue, feed, follows, search, thumbnails, views,
+)
+from posts.counters import recount
+from posts.models import (
+    Comment, FeedEntry, Follow, Group, Post, User, UserStats,
+)
 from posts.forms import PostForm
-from yatube.settings import PAGE_LIMIT
+from posts.utils import ELLIPSIS, KeysetPaginator, WindowedPaginator
+from yatube.settings import COMMENTS_PAGE_LIMIT, PAGE_LIMIT
 
 NUMBER_OF_POSTS = 13
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+@contextmanager
+def committed():
+    """Выполняет колбэки ``on_commit`` на выходе, как после коммита.
+
+    ``TestCase`` держит тест в транзакции, которая не коммитится.
+    """
+    callbacks = []
+    with mock.patch.object(transaction, 'on_commit', callbacks.append):
+        yield
+        while callbacks:
+            callbacks.pop(0)()
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostTests(TestCase):
     @classmethod
@@ -93,6 +120,7 @@ class PostTests(TestCase):
 
         self.context_help(otvet=response)
         self.assertEqual(response.context.get('author'), self.user)
+        self.assertEqual(response.context.get('count'), 1)
 
     # Проверяет содержимое страницы с деталями поста
     def test_post_detail(self):
@@ -144,6 +172,20 @@ class PostTests(TestCase):
             reverse('posts:group_list', args=('test_slug',)))
         self.context_help(otvet=response)
 
+    def test_thumbnail_pregenerated(self):
+        """Миниатюра строится заранее, а до этого выводится заглушка"""
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        self.assertIsNone(
+            thumbnails.ready_thumbnail(self.post, '960x339'))
+        self.assertContains(
+            self.authorized_client.get(url), 'Изображение обрабатывается')
+        thumbnails.generate(self.post.id)
+        self.post.refresh_from_db()
+        self.assertIsNotNone(
+            thumbnails.ready_thumbnail(self.post, '960x339'))
+        self.assertNotContains(
+            self.authorized_client.get(url), 'Изображение обрабатывается')
+
     def test_add_comment(self):
         self.authorized_client.post(
             reverse('posts:add_comment', args=(self.post.id,)),
@@ -183,6 +225,8 @@ class PaginatorViewsTest(TestCase):
             )
             )
         Post.objects.bulk_create(cls.posts)
+        # bulk_create не шлёт сигналов: пересчитываем счётчики вручную
+        recount()
 
     def setUp(self):
         self.user = User.objects.create_user(username='mobpsycho100')
@@ -209,6 +253,75 @@ class PaginatorViewsTest(TestCase):
                         len(response.context.get('page_obj').object_list
                             ), lenght)
 
+    def test_elided_page_range(self):
+        """Навигация — окно вокруг текущей страницы при любом их числе"""
+        paginator = WindowedPaginator(range(100000), PAGE_LIMIT)
+        cases = (
+            (1, [1, 2, 3, ELLIPSIS, 10000]),
+            (5000, [1, ELLIPSIS, 4998, 4999, 5000, 5001, 5002,
+                    ELLIPSIS, 10000]),
+            (9999, [1, ELLIPSIS, 9997, 9998, 9999, 10000]),
+        )
+        for number, links in cases:
+            with self.subTest(page=number):
+                self.assertEqual(
+                    paginator.page(number).elided_page_range(), links
+                )
+        self.assertEqual(
+            WindowedPaginator(range(30), PAGE_LIMIT).page(2).page_links,
+            [1, 2, 3],
+        )
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='keyset')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=cls.author)
+            for number in range(NUMBER_OF_POSTS)
+        )
+        cls.expected = list(Post.objects.order_by('-created', '-id'))
+
+    def test_forward_and_backward(self):
+        """Курсоры проходят ленту вперёд и назад без пропусков"""
+        keyset = KeysetPaginator(Post.objects.all(), PAGE_LIMIT)
+        first = keyset.page()
+        self.assertEqual(list(first), self.expected[:PAGE_LIMIT])
+        self.assertFalse(first.has_previous())
+        second = keyset.page(first.next_cursor)
+        self.assertEqual(list(second), self.expected[PAGE_LIMIT:])
+        self.assertFalse(second.has_next())
+        back = keyset.page(second.previous_cursor)
+        self.assertEqual(list(back), self.expected[:PAGE_LIMIT])
+        self.assertFalse(back.has_previous())
+
+    def test_no_count_query(self):
+        """Страница читается одним запросом без COUNT"""
+        keyset = KeysetPaginator(Post.objects.all(), PAGE_LIMIT)
+        cursor = keyset.page().next_cursor
+        with self.assertNumQueries(1):
+            len(keyset.page(cursor))
+
+    def test_broken_cursor(self):
+        """Битый курсор отдаёт первую страницу"""
+        keyset = KeysetPaginator(Post.objects.all(), PAGE_LIMIT)
+        page = keyset.get_page('не-курсор')
+        self.assertEqual(list(page), self.expected[:PAGE_LIMIT])
+
+    def test_null_cursor(self):
+        """Курсор с null вместо значений отдаёт первую страницу"""
+        keyset = KeysetPaginator(Post.objects.all(), PAGE_LIMIT)
+        cursor = base64.urlsafe_b64encode(b'["n",null,null]').decode()
+        page = keyset.get_page(cursor)
+        self.assertEqual(list(page), self.expected[:PAGE_LIMIT])
+        response = self.client.get(
+            reverse('posts:comments', args=(self.expected[0].id,)),
+            {'cursor': cursor},
+        )
+        self.assertEqual(response.status_code, 200)
+
 
 class CacheTests(TestCase):
     @classmethod
@@ -237,6 +350,468 @@ class CacheTests(TestCase):
         self.assertNotEqual(first_state.content, third_state.content)
 
 
+class CardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='card_author')
+        cls.group = Group.objects.create(title='Группа', slug='cards')
+        cls.post = Post.objects.create(
+            text='Карточка поста',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        cards.reset_stats()
+
+    def test_warm_page_hits_cache(self):
+        """Повторный рендер берёт карточку из кэша"""
+        # Анонимам отдаётся кэш целой страницы, поэтому входим
+        self.client.force_login(self.user)
+        url = reverse('posts:profile', args=(self.user.username,))
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(cards.stats(), {'hits': 1, 'misses': 1})
+
+    def test_edit_invalidates_card(self):
+        """Правка поста, группы или автора меняет ключ карточки"""
+        keys = {cards.card_key(self.post)}
+        self.post.text = 'Новый текст'
+        self.post.save()
+        keys.add(cards.card_key(self.post))
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.post.refresh_from_db()
+        keys.add(cards.card_key(self.post))
+        self.user.first_name = 'Имя'
+        self.user.save()
+        self.post.refresh_from_db()
+        keys.add(cards.card_key(self.post))
+        self.assertEqual(len(keys), 4)
+        self.assertIn('Новый текст', cards.render_cards([self.post])[0])
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='page_author')
+        cls.group = Group.objects.create(title='Первая', slug='first')
+        cls.other_group = Group.objects.create(title='Вторая', slug='second')
+        cls.post = Post.objects.create(
+            text='Исходный текст', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторный анонимный запрос не ходит в базу"""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+
+    def test_post_edit_purges_only_affected_pages(self):
+        """Правка поста сбрасывает его группу и профиль, но не чужую группу"""
+        urls = {
+            'group': reverse('posts:group_list', args=(self.group.slug,)),
+            'profile': reverse('posts:profile', args=(self.user.username,)),
+            'other': reverse('posts:group_list',
+                             args=(self.other_group.slug,)),
+        }
+        for url in urls.values():
+            self.client.get(url)
+        with committed():
+            self.post.text = 'Новый текст'
+            self.post.save()
+        self.assertContains(self.client.get(urls['group']), 'Новый текст')
+        self.assertContains(self.client.get(urls['profile']), 'Новый текст')
+        with self.assertNumQueries(0):
+            self.client.get(urls['other'])
+
+    def test_post_moved_purges_old_group(self):
+        """Перенос поста в другую группу сбрасывает обе группы"""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        self.client.get(url)
+        post = Post.objects.get(id=self.post.id)
+        post.group = self.other_group
+        with committed():
+            post.save()
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_conditional_get(self):
+        """Совпавший If-None-Match даёт 304 без запросов к базе"""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_post_edit_changes_etag(self):
+        """После правки поста старый ETag не подходит"""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        etag = self.client.get(url)['ETag']
+        post = Post.objects.get(id=self.post.id)
+        post.text = 'Исправленный текст'
+        with committed():
+            post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Исправленный текст')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_purge_at_write_and_commit(self):
+        """Страница сбрасывается и при записи, и ещё раз после коммита"""
+        url = reverse('posts:profile', args=(self.user.username,))
+        self.client.get(url)
+        with committed():
+            self.post.text = 'Ещё не закоммичен'
+            self.post.save()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertTrue(queries.captured_queries)
+            # Читатель до коммита снова положил страницу в кэш
+            with self.assertNumQueries(0):
+                self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertTrue(queries.captured_queries)
+        self.assertContains(response, 'Ещё не закоммичен')
+
+    def test_cache_headers(self):
+        """Анонимам — public для прокси, авторизованным — private"""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertFalse(response.has_header('ETag'))
+
+
+class GroupDirectoryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='directory_author')
+        cls.quiet = Group.objects.create(title='Тихая', slug='quiet')
+        cls.busy = Group.objects.create(title='Живая', slug='busy')
+        Post.objects.create(text='Пост', author=cls.user, group=cls.busy)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_directory(self):
+        """Каталог групп: свежие сверху, с числом постов"""
+        response = self.client.get(reverse('posts:group_index'))
+        groups = list(response.context['page_obj'])
+        self.assertEqual(groups, [self.busy, self.quiet])
+        self.assertEqual(groups[0].posts_count, 1)
+        self.assertContains(
+            response, reverse('posts:group_list', args=(self.busy.slug,))
+        )
+
+    def test_directory_purged(self):
+        """Новый пост и удаление группы сбрасывают кэш каталога"""
+        url = reverse('posts:group_index')
+        self.client.get(url)
+        with committed():
+            Post.objects.create(
+                text='Ещё', author=self.user, group=self.quiet
+            )
+        groups = list(self.client.get(url).context['page_obj'])
+        self.assertEqual(groups, [self.quiet, self.busy])
+        with committed():
+            Group.objects.get(id=self.quiet.id).delete()
+        groups = list(self.client.get(url).context['page_obj'])
+        self.assertEqual(groups, [self.busy])
+
+    def test_group_lookup_cached(self):
+        """Группа по slug берётся из кэша и сбрасывается при правке"""
+        self.client.force_login(self.user)
+        url = reverse('posts:group_list', args=(self.busy.slug,))
+        self.client.get(url)
+        # Только страница постов: сессия и пользователь тоже из кэша
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        group = Group.objects.get(id=self.busy.id)
+        group.title = 'Переименованная'
+        with committed():
+            group.save()
+        self.assertContains(self.client.get(url), 'Переименованная')
+
+    def test_missing_group(self):
+        """Несуществующая группа — 404"""
+        response = self.client.get(reverse('posts:group_list', args=('no',)))
+        self.assertEqual(response.status_code, 404)
+
+
+class PostDetailQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='detail_author')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    def add_comments(self, number):
+        for index in range(number):
+            author = User.objects.create_user(
+                username=f'commenter_{Comment.objects.count()}'
+            )
+            Comment.objects.create(
+                post=self.post, author=author, text=f'Комментарий {index}'
+            )
+
+    def count_queries(self):
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return len(queries), response
+
+    def test_queries_do_not_grow_with_comments(self):
+        """Число запросов не зависит от числа комментариев"""
+        self.add_comments(2)
+        few, _ = self.count_queries()
+        self.add_comments(COMMENTS_PAGE_LIMIT + 5)
+        many, response = self.count_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(
+            len(response.context['page_obj']), COMMENTS_PAGE_LIMIT)
+
+    def test_missing_post(self):
+        """Несуществующий пост отдаёт 404"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id + 100,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_comments_pages(self):
+        """Комментарии листаются курсором кусочками HTML и в JSON"""
+        self.add_comments(COMMENTS_PAGE_LIMIT + 5)
+        detail = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,)))
+        cursor = detail.context['page_obj'].next_cursor
+        self.assertContains(detail, 'Показать ещё')
+        url = reverse('posts:comments', args=(self.post.id,))
+        fragment = self.client.get(url, {'cursor': cursor})
+        self.assertNotContains(fragment, '<html')
+        self.assertContains(
+            fragment, f'Комментарий {COMMENTS_PAGE_LIMIT + 4}')
+        self.assertNotContains(fragment, 'Показать ещё')
+        data = self.client.get(
+            url, {'cursor': cursor}, HTTP_ACCEPT='application/json').json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(
+            self.client.get(reverse(
+                'posts:comments', args=(self.post.id + 100,))).status_code,
+            404,
+        )
+
+    def test_add_comment_fragment(self):
+        """Комментарий из скрипта возвращается кусочком HTML"""
+        self.client.force_login(self.user)
+        url = reverse('posts:add_comment', args=(self.post.id,))
+        response = self.client.post(
+            url, {'text': 'Новый'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 201)
+        self.assertContains(response, 'Новый', status_code=201)
+        self.assertNotContains(response, '<html', status_code=201)
+        response = self.client.post(
+            url, {'text': ''}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+
+
+class CommentQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='queue_author')
+        cls.reader = User.objects.create_user(username='queue_reader')
+        cls.post = Post.objects.create(text='Вирусный пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        queue_dir = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, queue_dir, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(views, 'COMMENT_WRITE_BEHIND', True),
+            mock.patch.object(comment_queue, 'COMMENT_QUEUE_DIR', queue_dir),
+            # Переносим очередь вручную, а не фоновым потоком
+            mock.patch.object(comment_queue, 'start_worker'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def add_comment(self, text, **extra):
+        return self.client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            {'text': text}, **extra,
+        )
+
+    def detail(self, client):
+        return client.get(
+            reverse('posts:post_detail', args=(self.post.id,)))
+
+    def test_comment_waits_in_queue(self):
+        """Комментарий ставится в очередь и виден только автору"""
+        response = self.add_comment(
+            'Из очереди', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertContains(response, 'ожидает публикации', status_code=201)
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(self.detail(self.client), 'Из очереди')
+        reader = Client()
+        reader.force_login(self.reader)
+        self.assertNotContains(self.detail(reader), 'Из очереди')
+
+    def test_flush(self):
+        """Очередь переносится в базу пачками и один раз"""
+        with mock.patch.object(comment_queue, 'COMMENT_FLUSH_BATCH', 2):
+            for index in range(3):
+                self.add_comment(f'Комментарий {index}')
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(comment_queue.flush(), 3)
+        inserts = [
+            query for query in queries
+            if query['sql'].startswith('INSERT INTO "posts_comment"')
+        ]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(
+            list(Comment.objects.order_by('created')
+                 .values_list('text', flat=True)),
+            ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'],
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+        response = self.detail(self.client)
+        self.assertEqual(list(response.context['pending_comments']), [])
+        self.assertNotContains(response, 'ожидает публикации')
+        self.assertEqual(comment_queue.flush(), 0)
+
+    def test_pending_across_processes(self):
+        """Перенесённый другим процессом комментарий не показан дважды"""
+        self.add_comment('Первый')
+        self.add_comment('Второй')
+        self.assertEqual(
+            [comment.text for comment in
+             comment_queue.pending(self.post.id, self.user)],
+            ['Первый', 'Второй'],
+        )
+        # Очередь перенёс процесс с другим кэшем: наш кэш не очищен
+        with mock.patch.object(comment_queue, '_forget_pending'):
+            comment_queue.flush()
+        self.assertEqual(comment_queue.pending(self.post.id, self.user), [])
+        response = self.detail(self.client)
+        self.assertNotContains(response, 'ожидает публикации')
+        self.assertContains(response, 'Второй', count=1)
+
+    def test_flush_after_crash(self):
+        """Файл, перенесённый до сбоя, не создаёт дубликатов"""
+        self.add_comment('Один раз')
+        comment_queue._rotate()
+        flushing = [
+            name for name in os.listdir(comment_queue.COMMENT_QUEUE_DIR)
+            if name.startswith(comment_queue.FLUSHING_PREFIX)
+        ]
+        path = os.path.join(comment_queue.COMMENT_QUEUE_DIR, flushing[0])
+        with open(path) as queue:
+            saved = queue.read()
+        comment_queue.flush()
+        # Процесс упал после вставки, но до удаления файла
+        with open(path, 'w') as queue:
+            queue.write(saved + '{"uid": "обрыв')
+        with self.assertLogs(comment_queue.logger, 'WARNING'):
+            self.assertEqual(comment_queue.flush(), 0)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_missing_post(self):
+        """Комментарий к несуществующему посту отдаёт 404"""
+        response = self.client.post(
+            reverse('posts:add_comment', args=(self.post.id + 100,)),
+            {'text': 'Мимо'},
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.post = Post.objects.create(
+            text='Кошки любят <спать> на солнце', author=cls.user)
+        Post.objects.bulk_create(
+            Post(text=f'Собака номер {index}', author=cls.user)
+            for index in range(PAGE_LIMIT + 3)
+        )
+
+    def setUp(self):
+        # Тесты правят пост, поэтому каждый берёт свою копию из базы
+        self.post = Post.objects.get(pk=self.post.pk)
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+
+    def test_finds_and_highlights(self):
+        """Поиск находит пост по началу слова и подсвечивает совпадение"""
+        response = self.search('кошк')
+        results = list(response.context['results'])
+        self.assertEqual([result.post for result in results], [self.post])
+        self.assertIn('<mark>Кошки</mark>', results[0].snippet)
+        self.assertIn('&lt;спать&gt;', results[0].snippet)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Правка и удаление поста сразу видны в поиске"""
+        self.post.text = 'Теперь про попугаев'
+        self.post.save()
+        self.assertFalse(search.search('кошки').results)
+        self.assertEqual(
+            search.search('попугаев').results[0].post, self.post)
+        self.post.delete()
+        self.assertFalse(search.search('попугаев').results)
+
+    def test_cursor_pages_through_results(self):
+        """Курсор листает результаты без повторов и пропусков"""
+        first = self.search('собака').context['results']
+        self.assertEqual(len(first), PAGE_LIMIT)
+        second = self.search(
+            'собака', cursor=first.next_cursor).context['results']
+        self.assertFalse(second.has_next())
+        ids = [result.post.id for result in [*first, *second]]
+        self.assertEqual(len(set(ids)), PAGE_LIMIT + 3)
+
+    def test_inverted_index_fallback(self):
+        """Запасной обратный индекс ищет так же, как FTS5"""
+        fallback = search.InvertedIndexBackend()
+        with mock.patch.object(search, '_backend', fallback):
+            self.assertEqual(
+                search.search('кошк').results[0].post, self.post)
+            self.post.text = 'Теперь про попугаев'
+            self.post.save()
+            self.assertFalse(search.search('кошки').results)
+            self.assertEqual(
+                search.search('попуга').results[0].post, self.post)
+            self.assertEqual(fallback._vocabulary, sorted(fallback._postings))
+            page = search.search('собака')
+            rest = search.search('собака', page.next_cursor)
+        self.assertEqual(len(page) + len(rest), PAGE_LIMIT + 3)
+
+    def test_empty_query(self):
+        """Пустой запрос и спецсимволы не ломают поиск"""
+        self.assertEqual(self.search('').status_code, 200)
+        self.assertEqual(self.search('"*( OR').status_code, 200)
+
+
 class FollowTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -300,3 +875,108 @@ class FollowTests(TestCase):
             reverse('posts:follow_index'))
         lenght = len(response.context.get('favorites').object_list)
         self.assertEqual(lenght, 0)
+
+    def test_follow_idempotent(self):
+        """Повторная подписка и отписка ничего не ломают"""
+        follow_url = reverse(
+            'posts:profile_follow', args=(self.user_following.username,))
+        unfollow_url = reverse(
+            'posts:profile_unfollow', args=(self.user_following.username,))
+        for _ in range(2):
+            self.client_auth_follower.get(follow_url)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(UserStats.objects.get(
+            user=self.user_following).followers_count, 1)
+        for _ in range(2):
+            self.client_auth_follower.get(unfollow_url)
+        self.assertEqual(Follow.objects.count(), 0)
+        self.client_auth_following.get(follow_url)
+        self.assertEqual(Follow.objects.count(), 0)
+        response = self.client_auth_follower.get(
+            reverse('posts:profile_follow', args=('nobody',)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_is_following_cached(self):
+        """Проверка подписки на многих авторов идёт без запросов"""
+        cache.clear()
+        authors = [self.user_following, self.user_follower]
+        self.assertEqual(
+            follows.is_following(self.user_follower, authors),
+            {self.user_following.id: False, self.user_follower.id: False},
+        )
+        with committed():
+            follows.follow(self.user_follower, self.user_following)
+        follows.is_following(self.user_follower, authors)
+        with self.assertNumQueries(0):
+            following = follows.is_following(self.user_follower, authors)
+        self.assertTrue(following[self.user_following.id])
+        self.assertFalse(following[self.user_follower.id])
+        self.assertFalse(follows.follow(
+            self.user_follower, self.user_following))
+        with committed():
+            self.assertTrue(follows.unfollow(
+                self.user_follower, self.user_following))
+        self.assertFalse(follows.is_following(
+            self.user_follower, authors)[self.user_following.id])
+
+    def test_feed_fan_out_and_prune(self):
+        """Новый пост раскладывается подписчикам, отписка чистит ленту"""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following,
+        )
+        post = Post.objects.create(
+            author=self.user_following,
+            text='Пост после подписки',
+        )
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user_follower, post=post).exists())
+        self.client_auth_follower.get(reverse(
+            'posts:profile_unfollow', args=(self.user_following.username,)))
+        self.assertFalse(FeedEntry.objects.filter(
+            user=self.user_follower).exists())
+
+    def test_feed_demotion_backfills(self):
+        """Автор, опустившийся до порога, докладывается в ленты"""
+        reader = User.objects.create_user(username='late_reader')
+        with mock.patch.object(feed, 'FEED_FANOUT_LIMIT', 1), \
+                mock.patch.object(tasks, 'BACKGROUND_WORKERS', 0), \
+                committed():
+            Follow.objects.create(
+                user=self.user_follower, author=self.user_following)
+            Follow.objects.create(user=reader, author=self.user_following)
+            self.assertFalse(FeedEntry.objects.filter(user=reader).exists())
+            Follow.objects.filter(user=self.user_follower).delete()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=reader, post=self.post).exists())
+
+    def test_feed_rebuild_limit(self):
+        """Пересборка берёт от автора столько постов, сколько подписка"""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        newest = Post.objects.create(
+            author=self.user_following, text='Свежий пост')
+        feed.rebuild(limit=1)
+        self.assertEqual(
+            list(FeedEntry.objects.filter(user=self.user_follower)
+                 .values_list('post_id', flat=True)),
+            [newest.id],
+        )
+
+    def test_feed_fan_out_on_read(self):
+        """Посты популярных авторов подмешиваются при чтении"""
+        cache.delete(feed.CELEBRITIES_KEY)
+        with mock.patch.object(feed, 'FEED_FANOUT_LIMIT', 0):
+            Follow.objects.create(
+                user=self.user_follower,
+                author=self.user_following,
+            )
+            post = Post.objects.create(
+                author=self.user_following,
+                text='Пост популярного автора',
+            )
+            self.assertFalse(FeedEntry.objects.exists())
+            response = self.client_auth_follower.get(
+                reverse('posts:follow_index'))
+        cache.delete(feed.CELEBRITIES_KEY)
+        self.assertIn(post, response.context['favorites'].object_list)
@@ -0,0 +1,50 @@
+"""Предварительная генерация миниатюр картинок постов.
+
+Миниатюры всех размеров из ``POST_THUMBNAILS`` строятся фоновой задачей
+сразу после перекодировки новой картинки поста (см. ``posts.images``).
+Имена готовых миниатюр записываются в ``Post.thumbnails`` вместе с
+именем картинки, для которой они построены. Шаблоны только проверяют
+запись и хранилище sorl и до появления миниатюры выводят заглушку,
+поэтому декодирование и масштабирование никогда не идут в запросе.
+"""
+import json
+
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from yatube.settings import POST_THUMBNAILS
+
+from .models import Post
+
+
+def ready_thumbnail(post, geometry):
+    """Готовая миниатюра картинки поста или None; сама её не создаёт."""
+    if not post.image or not post.thumbnails:
+        return None
+    stored = json.loads(post.thumbnails)
+    # Имена записаны для прежней картинки: новая ещё обрабатывается
+    if stored.get('image') != post.image.name:
+        return None
+    name = stored['sizes'].get(geometry)
+    if name is None:
+        return None
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def generate(post_id):
+    post = Post.objects.filter(id=post_id).first()
+    if post is None or not post.image:
+        return
+    sizes = {
+        geometry: get_thumbnail(post.image, geometry, **options).name
+        for geometry, options in POST_THUMBNAILS.items()
+    }
+    post.thumbnails = json.dumps({'image': post.image.name, 'sizes': sizes})
+    # Карточки и страницы с заглушкой надо перерисовать
+    post.save(update_fields=('thumbnails', 'version'))
+
+
+def image_changed(post, created):
+    if not post.image:
+        return False
+    return created or post.image.name != post.loaded_value('image')
@@ -0,0 +1,312 @@
+"""Перенос контента между инсталляциями в формате JSON Lines.
+
+Каждая строка — объект с полем ``type`` (``user``, ``group``, ``post``,
+``comment``, ``follow``). Экспорт пишет типы в порядке зависимостей и
+читает базу итераторами, импорт копит строки в пачки по ``batch_size`` и
+вставляет их ``bulk_create`` в отдельных транзакциях, поэтому память не
+растёт с размером дампа.
+
+Авторы и группы ссылаются на ``username`` и ``slug``, посты — на свой id
+в исходной базе. Новым постам и комментариям id назначаются заранее,
+начиная с текущего максимума, поэтому импорт нельзя запускать
+параллельно с публикацией. Пароли и файлы картинок не переносятся: в
+дампе только путь к картинке, файлы копируются отдельно.
+
+Повторный импорт того же дампа ничего не дублирует: пост узнаётся по
+автору и дате создания, комментарий — по посту, автору и дате. Счётчики,
+ленты и поиск пересчитываются и тогда, когда импорт прервала ошибка.
+"""
+import json
+import time
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from . import feed, follows, search
+from .counters import recount
+from .models import Comment, Follow, Group, Post, User
+from .page_cache import (
+    GROUPS_TAG, INDEX_TAG, group_tag, invalidate, profile_tag,
+)
+
+BATCH_SIZE = 5000
+CHUNK_SIZE = 2000
+ORDER = ('user', 'group', 'post', 'comment', 'follow')
+
+
+class TransferError(ValueError):
+    pass
+
+
+def export_rows():
+    """Строки дампа: словари, готовые к ``json.dumps``."""
+    users = User.objects.order_by('id').values_list(
+        'username', 'first_name', 'last_name', 'email'
+    )
+    for username, first_name, last_name, email in users.iterator(CHUNK_SIZE):
+        yield {
+            'type': 'user', 'username': username, 'first_name': first_name,
+            'last_name': last_name, 'email': email,
+        }
+    groups = Group.objects.order_by('id').values_list(
+        'slug', 'title', 'description'
+    )
+    for slug, title, description in groups.iterator(CHUNK_SIZE):
+        yield {
+            'type': 'group', 'slug': slug, 'title': title,
+            'description': description,
+        }
+    posts = Post.objects.order_by('id').values_list(
+        'id', 'author__username', 'group__slug', 'text', 'image', 'created'
+    )
+    for post_id, author, group, text, image, created in posts.iterator(
+        CHUNK_SIZE
+    ):
+        yield {
+            'type': 'post', 'id': post_id, 'author': author, 'group': group,
+            'text': text, 'image': image, 'created': created.isoformat(),
+        }
+    comments = Comment.objects.order_by('id').values_list(
+        'post_id', 'author__username', 'text', 'created'
+    )
+    for post_id, author, text, created in comments.iterator(CHUNK_SIZE):
+        yield {
+            'type': 'comment', 'post': post_id, 'author': author,
+            'text': text, 'created': created.isoformat(),
+        }
+    follows = Follow.objects.order_by('id').values_list(
+        'user__username', 'author__username'
+    )
+    for user, author in follows.iterator(CHUNK_SIZE):
+        yield {'type': 'follow', 'user': user, 'author': author}
+
+
+def export_lines():
+    # Даты — в isoformat с микросекундами: от них зависит порядок лент
+    for row in export_rows():
+        yield json.dumps(row, ensure_ascii=False)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def restore_created(objs, dates):
+    """Возвращает строкам после ``bulk_create`` даты из дампа.
+
+    ``auto_now_add`` подставляет при вставке текущее время. Само поле
+    модели общее для всех потоков процесса, поэтому его не трогаем, а
+    дату переписываем отдельным UPDATE по заранее назначенным id.
+    """
+    for obj, created in zip(objs, dates):
+        obj.created = created
+    if objs:
+        objs[0]._meta.model.objects.bulk_update(objs, ['created'])
+
+
+class Importer:
+    """Импорт дампа пачками; ``progress(type, total, rate)`` — отчёт."""
+
+    def __init__(self, batch_size=BATCH_SIZE, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.users = dict(User.objects.values_list('username', 'id'))
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.posts = {}
+        self.next_post_id = next_id(Post)
+        self.next_comment_id = next_id(Comment)
+        self.buffers = {kind: [] for kind in ORDER}
+        self.totals = dict.fromkeys(ORDER, 0)
+        self.touched_groups = set()
+        self.touched_authors = set()
+        self.touched_followers = set()
+        self.started = time.monotonic()
+
+    def user_id(self, username):
+        try:
+            return self.users[username]
+        except KeyError:
+            raise TransferError(f'Неизвестный пользователь: {username}')
+
+    def group_id(self, slug):
+        if not slug:
+            return None
+        self.touched_groups.add(slug)
+        try:
+            return self.groups[slug]
+        except KeyError:
+            raise TransferError(f'Неизвестная группа: {slug}')
+
+    @staticmethod
+    def created(row):
+        created = parse_datetime(row['created'])
+        if created is None:
+            raise TransferError(f'Некорректная дата: {row["created"]!r}')
+        return created
+
+    def build_user(self, row):
+        if row['username'] in self.users:
+            return None
+        self.users[row['username']] = None
+        return User(
+            username=row['username'],
+            first_name=row.get('first_name', ''),
+            last_name=row.get('last_name', ''),
+            email=row.get('email', ''),
+            password='!',
+        )
+
+    def build_group(self, row):
+        if row['slug'] in self.groups:
+            return None
+        self.groups[row['slug']] = None
+        return Group(
+            slug=row['slug'], title=row['title'],
+            description=row.get('description', ''),
+        )
+
+    def build_post(self, row):
+        post_id = self.next_post_id
+        self.next_post_id += 1
+        self.posts[row['id']] = post_id
+        self.touched_authors.add(row['author'])
+        post = Post(
+            id=post_id,
+            author_id=self.user_id(row['author']),
+            group_id=self.group_id(row.get('group')),
+            text=row['text'],
+            image=row.get('image') or '',
+            created=self.created(row),
+        )
+        post.source_id = row['id']
+        return post
+
+    def build_comment(self, row):
+        try:
+            post_id = self.posts[row['post']]
+        except KeyError:
+            raise TransferError(f'Неизвестный пост: {row["post"]}')
+        comment_id = self.next_comment_id
+        self.next_comment_id += 1
+        return Comment(
+            id=comment_id,
+            post_id=post_id,
+            author_id=self.user_id(row['author']),
+            text=row['text'],
+            created=self.created(row),
+        )
+
+    def build_follow(self, row):
+        user_id = self.user_id(row['user'])
+        self.touched_followers.add(user_id)
+        return Follow(user_id=user_id, author_id=self.user_id(row['author']))
+
+    def add(self, row):
+        kind = row.get('type')
+        if kind not in self.buffers:
+            raise TransferError(f'Неизвестный тип строки: {kind}')
+        # Пачки зависимых типов ждут, пока не вставлены те, на кого они
+        # ссылаются: id новых авторов и групп известны только после вставки
+        for earlier in ORDER[:ORDER.index(kind)]:
+            if self.buffers[earlier]:
+                self.flush(earlier)
+        obj = getattr(self, f'build_{kind}')(row)
+        if obj is None:
+            return
+        buffer = self.buffers[kind]
+        buffer.append(obj)
+        if len(buffer) >= self.batch_size:
+            self.flush(kind)
+
+    def skip_posts(self, batch):
+        found = {
+            (author_id, created): post_id
+            for post_id, author_id, created in Post.objects.filter(
+                author_id__in={post.author_id for post in batch},
+                created__in={post.created for post in batch},
+            ).values_list('id', 'author_id', 'created')
+        }
+        fresh = []
+        for post in batch:
+            post_id = found.get((post.author_id, post.created))
+            if post_id is None:
+                fresh.append(post)
+            else:
+                # Уже загружен: комментарии дампа пойдут к нему
+                self.posts[post.source_id] = post_id
+        return fresh
+
+    def skip_comments(self, batch):
+        found = set(Comment.objects.filter(
+            post_id__in={comment.post_id for comment in batch},
+            created__in={comment.created for comment in batch},
+        ).values_list('post_id', 'author_id', 'created'))
+        return [
+            comment for comment in batch
+            if (comment.post_id, comment.author_id, comment.created)
+            not in found
+        ]
+
+    def flush(self, kind):
+        batch, self.buffers[kind] = self.buffers[kind], []
+        model = batch[0]._meta.model
+        if kind in ('post', 'comment'):
+            batch = getattr(self, f'skip_{kind}s')(batch)
+        dates = [getattr(obj, 'created', None) for obj in batch]
+        with transaction.atomic():
+            model.objects.bulk_create(
+                batch, ignore_conflicts=kind == 'follow'
+            )
+            if kind in ('post', 'comment'):
+                restore_created(batch, dates)
+        if kind == 'user':
+            self.users.update(User.objects.filter(
+                username__in=[user.username for user in batch]
+            ).values_list('username', 'id'))
+        elif kind == 'group':
+            self.groups.update(Group.objects.filter(
+                slug__in=[group.slug for group in batch]
+            ).values_list('slug', 'id'))
+        self.totals[kind] += len(batch)
+        if self.progress:
+            elapsed = time.monotonic() - self.started
+            rate = sum(self.totals.values()) / (elapsed or 1)
+            self.progress(kind, self.totals[kind], rate)
+
+    def flush_all(self):
+        for kind in ORDER:
+            if self.buffers[kind]:
+                self.flush(kind)
+
+    def refresh(self):
+        # bulk_create не шлёт сигналов: счётчики, ленты, поиск и кэш
+        # страниц обновляем одним проходом
+        recount()
+        feed.rebuild()
+        search.backend().reset()
+        follows.forget(*self.touched_followers)
+        invalidate(
+            INDEX_TAG,
+            GROUPS_TAG,
+            *map(group_tag, self.touched_groups),
+            *map(profile_tag, self.touched_authors),
+        )
+
+
+def import_lines(lines, batch_size=BATCH_SIZE, progress=None):
+    importer = Importer(batch_size, progress)
+    try:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                importer.add(json.loads(line))
+            except (KeyError, TypeError, ValueError) as error:
+                raise TransferError(f'Строка {number}: {error}')
+        importer.flush_all()
+    finally:
+        # Вставленные до ошибки пачки уже в базе: счётчики и ленты
+        # должны их учитывать
+        importer.refresh()
+    return importer.totals
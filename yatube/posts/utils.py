@@ -1,10 +1,230 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from functools import reduce
+from operator import or_
 
-from yatube.settings import PAGE_LIMIT
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
 
+from yatube.settings import (
+    KEYSET_PAGINATION, PAGE_LIMIT, PAGE_NAV_ON_EACH_SIDE, PAGE_NAV_ON_ENDS,
+)
 
-def paginator(request, posts, limit=PAGE_LIMIT):
-    paginator = Paginator(posts, limit)
+KEYSET_ORDERING = ('-created', '-id')
+ELLIPSIS = '…'
+CURSOR_PARAM = 'cursor'
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPage(Sequence):
+    """Страница keyset-паджинатора: без COUNT(*) и без OFFSET."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(FORWARD, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor(BACKWARD, self.object_list[0])
+
+
+class KeysetPaginator:
+    """Паджинация по ключу сортировки (по умолчанию ``(created, id)``).
+
+    Следующая страница выбирается условием ``WHERE (created, id) < курсор``
+    и ``LIMIT per_page + 1``, поэтому стоимость запроса не зависит от
+    глубины страницы. Все поля сортировки должны идти в одном направлении,
+    а последнее из них должно быть уникальным.
+    """
+
+    def __init__(self, object_list, per_page, ordering=KEYSET_ORDERING):
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(name.lstrip('-') for name in self.ordering)
+        self.descending = self.ordering[0].startswith('-')
+        if any(
+            name.startswith('-') != self.descending for name in self.ordering
+        ):
+            raise ValueError('Все поля сортировки должны идти в одну сторону')
+        self.object_list = object_list.order_by(*self.ordering)
+        self.model = object_list.model
+
+    def encode_cursor(self, direction, obj):
+        values = [
+            self.model._meta.get_field(name).value_to_string(obj)
+            for name in self.fields
+        ]
+        raw = json.dumps([direction] + values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        padded = cursor + '=' * (-len(cursor) % 4)
+        try:
+            direction, *raw_values = json.loads(
+                base64.urlsafe_b64decode(padded.encode()).decode()
+            )
+            if (
+                direction not in (FORWARD, BACKWARD)
+                or len(raw_values) != len(self.fields)
+            ):
+                raise InvalidCursor(cursor)
+            values = [
+                self.model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, raw_values)
+            ]
+            # None нельзя сравнить в WHERE: такой курсор не выдаёт наш код
+            if None in values:
+                raise InvalidCursor(cursor)
+        except (
+            binascii.Error, UnicodeDecodeError, TypeError,
+            ValueError, ValidationError,
+        ):
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    def _after(self, values, forward):
+        lookup = 'lt' if forward == self.descending else 'gt'
+        conditions = []
+        for position, name in enumerate(self.fields):
+            equal = dict(zip(self.fields[:position], values[:position]))
+            equal[f'{name}__{lookup}'] = values[position]
+            conditions.append(Q(**equal))
+        return reduce(or_, conditions)
+
+    def page(self, cursor=None):
+        if not cursor:
+            rows = list(self.object_list[:self.per_page + 1])
+            return CursorPage(
+                rows[:self.per_page], self, len(rows) > self.per_page, False
+            )
+        direction, values = self.decode_cursor(cursor)
+        if direction == FORWARD:
+            rows = list(
+                self.object_list.filter(self._after(values, True))
+                [:self.per_page + 1]
+            )
+            return CursorPage(
+                rows[:self.per_page], self, len(rows) > self.per_page, True
+            )
+        reverse_ordering = [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+        rows = list(
+            self.object_list.filter(self._after(values, False))
+            .order_by(*reverse_ordering)[:self.per_page + 1]
+        )
+        return CursorPage(
+            rows[:self.per_page][::-1], self, True, len(rows) > self.per_page
+        )
+
+    def get_page(self, cursor=None):
+        """Как ``Paginator.get_page``: битый курсор даёт первую страницу."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+class WindowedPage(Page):
+    """Страница с навигацией по окну номеров вокруг текущей."""
+
+    def elided_page_range(
+        self, on_each_side=PAGE_NAV_ON_EACH_SIDE, on_ends=PAGE_NAV_ON_ENDS
+    ):
+        """Номера для навигации: края, окно вокруг текущей и ``ELLIPSIS``.
+
+        Длина не больше ``2 * (on_each_side + on_ends) + 3`` при любом
+        числе страниц, в отличие от ``paginator.page_range``.
+        """
+        number = self.number
+        num_pages = self.paginator.num_pages
+        if num_pages <= (on_each_side + on_ends + 1) * 2:
+            return list(range(1, num_pages + 1))
+        if number > on_each_side + on_ends + 2:
+            links = [*range(1, on_ends + 1), ELLIPSIS]
+            links += range(number - on_each_side, number + 1)
+        else:
+            links = list(range(1, number + 1))
+        if number < num_pages - on_each_side - on_ends - 1:
+            links += range(number + 1, number + on_each_side + 1)
+            links += [ELLIPSIS, *range(num_pages - on_ends + 1, num_pages + 1)]
+        else:
+            links += range(number + 1, num_pages + 1)
+        return links
+
+    @property
+    def page_links(self):
+        return self.elided_page_range()
+
+
+class WindowedPaginator(Paginator):
+    def _get_page(self, *args, **kwargs):
+        return WindowedPage(*args, **kwargs)
+
+
+def paginator(
+    request, posts, limit=PAGE_LIMIT, keyset=KEYSET_PAGINATION, count=None,
+    ordering=KEYSET_ORDERING,
+):
+    if keyset:
+        return KeysetPaginator(posts, limit, ordering).get_page(
+            request.GET.get(CURSOR_PARAM)
+        )
+    paginator = WindowedPaginator(posts, limit)
+    if count is not None:
+        # Известное заранее число объектов избавляет от запроса COUNT(*)
+        paginator.count = count
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def wants_fragment(request):
+    """Запрос из скрипта страницы: ответить кусочком HTML, а не страницей."""
+    return request.is_ajax() or 'HTTP_HX_REQUEST' in request.META
+
+
+def wants_json(request):
+    return (
+        request.GET.get('format') == 'json'
+        or 'application/json' in request.META.get('HTTP_ACCEPT', '')
+    )
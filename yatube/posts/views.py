@@ -1,15 +1,50 @@
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import redirect
 from django.shortcuts import render, get_object_or_404
-
-from .utils import paginator
+from django.utils.cache import patch_vary_headers
+
+from yatube.settings import (
+    COMMENT_WRITE_BEHIND, COMMENTS_PAGE_LIMIT, PAGE_LIMIT,
+)
+
+from . import comment_queue, follows, search as post_search
+from .counters import stats_for
+from .feed import feed_posts
+from .groups import group_by_slug
+from .page_cache import (
+    GROUPS_TAG, cache_anonymous_page, group_tag, index_tags, profile_tag
+)
+from .serializers import comment_json
+from .utils import paginator, wants_fragment, wants_json
 from .forms import PostForm, CommentForm
-from .models import Post, Group, Comment, Follow, User
+from .models import Comment, Post, Group, User
+
+# Комментарии идут от старых к новым и листаются курсором
+COMMENTS_ORDERING = ('created', 'id')
+
+
+def index_posts():
+    return Post.objects.select_related('group', 'author').all()
+
+
+def groups_directory():
+    # В SQLite NULL меньше любых значений: группы без постов — в конце
+    return Group.objects.order_by('-last_post_at', '-id')
+
+
+def group_posts_of(group):
+    return group.posts.select_related('group', 'author').all()
+
 
+def profile_posts_of(author):
+    # Автор уже известен менеджеру связи, JOIN с ним не нужен
+    return author.posts.select_related('group').all()
 
+
+@cache_anonymous_page(index_tags)
 def index(request):
-    post_list = Post.objects.select_related(
-        'group', 'author').all()
+    post_list = index_posts()
     page_obj = paginator(request, post_list)
     context = {
         'page_obj': page_obj,
@@ -17,11 +52,20 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_page(lambda request: (GROUPS_TAG,))
+def group_index(request):
+    page_obj = paginator(request, groups_directory(), keyset=False)
+    context = {
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/group_index.html', context)
+
+
+@cache_anonymous_page(lambda request, slug: (group_tag(slug),))
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related(
-        'group', 'author').all()
-    page_obj = paginator(request, post_list)
+    group = group_by_slug(slug)
+    post_list = group_posts_of(group)
+    page_obj = paginator(request, post_list, count=group.posts_count)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -29,19 +73,21 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_page(
+    lambda request, username: (profile_tag(username),)
+)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    postes = author.posts.select_related('group').all()
-    count = postes.count()
-    page_obj = paginator(request, postes)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
-    else:
-        following = False
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = stats_for(author)
+    postes = profile_posts_of(author)
+    count = stats.posts_count
+    page_obj = paginator(request, postes, count=count)
+    following = follows.is_following(request.user, [author])[author.id]
     context = {
         'count': count,
+        'stats': stats,
         'author': author,
         'page_obj': page_obj,
         'following': following,
@@ -51,20 +97,67 @@ def profile(request, username):
 
 
 def post_detail(request, post_id):
-    comment_post = Post.objects.get(id=post_id)
-    comments = Comment.objects.filter(post=comment_post)
+    comment_post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    page_obj = paginator(
+        request,
+        comment_post.comments.select_related('author'),
+        COMMENTS_PAGE_LIMIT,
+        keyset=True,
+        ordering=COMMENTS_ORDERING,
+    )
     form = CommentForm(request.POST or None)
     context = {
+        'count': stats_for(comment_post.author).posts_count,
         'post': comment_post,
         'form': form,
-        'comments': comments,
+        'comments': page_obj,
+        'page_obj': page_obj,
+        'pending_comments': comment_queue.pending(post_id, request.user),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Страница комментариев поста кусочком HTML или в JSON."""
+    page_obj = paginator(
+        request,
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        COMMENTS_PAGE_LIMIT,
+        keyset=True,
+        ordering=COMMENTS_ORDERING,
+    )
+    # Пост проверяем, только если комментариев нет: иначе он точно есть
+    if not page_obj and not Post.objects.filter(id=post_id).exists():
+        raise Http404
+    if wants_json(request):
+        response = JsonResponse({
+            'comments': [comment_json(comment) for comment in page_obj],
+            'next_cursor': page_obj.next_cursor,
+        })
+    else:
+        response = render(request, 'posts/includes/comments_page.html', {
+            'comments': page_obj,
+            'post_id': post_id,
+        })
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page = post_search.search(query, request.GET.get('cursor'), PAGE_LIMIT)
+    context = {
+        'query': query,
+        'results': page,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
@@ -97,19 +190,34 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    if not Post.objects.filter(id=post_id).exists():
+        raise Http404
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        if COMMENT_WRITE_BEHIND:
+            comment = comment_queue.enqueue(
+                post_id, request.user, form.cleaned_data['text']
+            )
+        else:
+            comment = form.save(commit=False)
+            comment.author = request.user
+            comment.post_id = post_id
+            comment.save()
+        if wants_fragment(request):
+            return render(
+                request,
+                'posts/includes/comment.html',
+                {'comment': comment},
+                status=201,
+            )
+    elif wants_fragment(request):
+        return HttpResponseBadRequest(form.errors.as_ul())
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    list_of_posts = Post.objects.filter(author__following__user=request.user)
+    list_of_posts = feed_posts(request.user)
     page_obj = paginator(request, list_of_posts)
     context = {
         'favorites': page_obj,
@@ -119,20 +227,15 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    user = request.user
-    author = User.objects.get(username=username)
-    is_follower = Follow.objects.filter(user=user, author=author)
-    if user != author and not is_follower.exists():
-        Follow.objects.create(user=user, author=author)
+    author = get_object_or_404(User, username=username)
+    follows.follow(request.user, author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    is_follower = Follow.objects.filter(user=request.user, author=author)
-    if is_follower.exists():
-        is_follower.delete()
+    follows.unfollow(request.user, author)
     return redirect('posts:profile', username=username)
 
 
@@ -27,7 +27,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.PinPrimaryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -40,7 +43,8 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендера для метрик
+        'BACKEND': 'core.metrics.InstrumentedTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -55,14 +59,71 @@ TEMPLATES = [
     },
 ]
 
+# Компилировать все шаблоны при старте WSGI-приложения (core.warmup);
+# имеет смысл только с кэширующим загрузчиком, см. settings_prod
+TEMPLATE_WARMUP = False
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Выполняются на каждом новом соединении (core.sqlite). WAL пускает
+# читателей параллельно с писателем; synchronous=NORMAL в режиме WAL
+# не теряет целостность, только последние транзакции при сбое питания
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Соединение живёт между запросами столько секунд; 0 — закрывать сразу
+CONN_MAX_AGE = int(os.environ.get('YATUBE_CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'PRAGMAS': SQLITE_PRAGMAS,
+    }
+}
+# Реплики только для чтения. Локально YATUBE_DB_REPLICAS=2 добавит файлы
+# db.replica1.sqlite3 и db.replica2.sqlite3; копирует в них основную базу
+# команда sync_replicas
+DATABASE_REPLICAS = []
+for number in range(1, int(os.environ.get('YATUBE_DB_REPLICAS', 0)) + 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.replica{number}.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'PRAGMAS': SQLITE_PRAGMAS,
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# После записи пользователь столько секунд читает из основной базы
+REPLICA_PIN_COOKIE = 'pin_primary'
+REPLICA_PIN_SECONDS = 5
+
+# Пользователь сессии берётся из кэша (core.auth). ModelBackend остаётся
+# для сессий, созданных до его появления: в них записан путь бэкенда
+AUTHENTICATION_BACKENDS = [
+    'core.auth.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+AUTH_USER_CACHE_TIMEOUT = 60 * 60
+
+# Хранилище сессий выбирается YATUBE_SESSIONS: cached_db читает сессию
+# из кэша и пишет сквозь него в базу, signed_cookies хранит её в
+# подписанной cookie и не трогает ни базу, ни кэш
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
 }
+SESSION_ENGINE = SESSION_ENGINES[
+    os.environ.get('YATUBE_SESSIONS', 'cached_db')
+]
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -100,6 +161,19 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGE_LIMIT = 10
+COMMENTS_PAGE_LIMIT = 20
+# Навигация по номерам страниц: соседи текущей страницы с каждой стороны
+# и страницы у краёв, остальное схлопывается в многоточие
+PAGE_NAV_ON_EACH_SIDE = 2
+PAGE_NAV_ON_ENDS = 1
+# Keyset-паджинация по (created, id) вместо OFFSET для лент постов
+KEYSET_PAGINATION = False
+# Лента подписок: авторы с большим числом подписчиков читаются при запросе,
+# а при подписке в ленту докладываются последние FEED_BACKFILL постов
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL = 100
+# Множество таких авторов считается по базе и живёт в кэше недолго
+FEED_CELEBRITIES_TIMEOUT = 60
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
@@ -111,3 +185,55 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+# Карточки постов кэшируются по версии, поэтому могут жить долго
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Группы по slug; запись сбрасывается при любом изменении группы
+GROUP_CACHE_TIMEOUT = 60 * 60
+# Множества авторов, на которых подписан пользователь (posts.follows)
+FOLLOWS_CACHE_TIMEOUT = 60 * 60
+# Страницы для анонимов: сбрасываются по тегам, глубже
+# PAGE_CACHE_INDEX_PAGES страницы главной истекают только по таймауту
+PAGE_CACHE_TIMEOUT = 60
+PAGE_CACHE_INDEX_PAGES = 5
+# Сколько секунд обратный прокси может отдавать анонимную страницу без
+# перепроверки; браузеры перепроверяют всегда (max-age=0)
+PAGE_PROXY_MAX_AGE = 5
+
+# Пул потоков для фоновых задач; 0 — выполнять задачи сразу
+BACKGROUND_WORKERS = 2
+# Загрузки больше этого размера Django пишет во временный файл кусками
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+# Картинки постов (posts.images): ограничения загрузки и перекодировка в
+# WebP по большей стороне не длиннее IMAGE_MAX_SIDE
+IMAGE_MAX_UPLOAD_SIZE = 10 * 2 ** 20
+IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+IMAGE_MAX_SIDE = 2048
+IMAGE_WEBP_QUALITY = 80
+# Отложенная запись комментариев (posts.comment_queue): add_comment
+# дописывает комментарий в файл очереди, фоновый поток раз в
+# COMMENT_FLUSH_INTERVAL секунд переносит его в базу пачками
+COMMENT_WRITE_BEHIND = os.environ.get('YATUBE_COMMENT_WRITE_BEHIND') == '1'
+COMMENT_QUEUE_DIR = os.path.join(BASE_DIR, 'comment_queue')
+COMMENT_FLUSH_INTERVAL = 0.5
+COMMENT_FLUSH_BATCH = 400
+# Размеры миниатюр, которые строятся заранее: геометрия -> опции sorl
+POST_THUMBNAILS = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+
+# Токен сборщика Prometheus для /metrics/ (Authorization: Bearer ...).
+# Адрес клиента не проверяется: за обратным прокси все запросы приходят
+# с 127.0.0.1. Без токена страница метрик закрыта
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+
+# Профили медленных запросов (core.profiling): стеки снимаются раз в
+# PROFILE_SAMPLE_INTERVAL секунд и сохраняются для ответов дольше
+# PROFILE_THRESHOLD секунд; хранятся последние PROFILE_KEEP профилей
+PROFILE_SLOW_REQUESTS = os.environ.get('YATUBE_PROFILE_SLOW') == '1'
+PROFILE_THRESHOLD = float(os.environ.get('YATUBE_PROFILE_THRESHOLD', 0.5))
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_KEEP = 50
+# Сколько секунд действует токен заголовка X-Profile
+PROFILE_TOKEN_MAX_AGE = 60 * 60
@@ -0,0 +1,30 @@
+"""Настройки для продакшена: ``DJANGO_SETTINGS_MODULE=yatube.settings_prod``.
+
+Отличаются от ``yatube.settings`` выключенным ``DEBUG`` и кэширующим
+загрузчиком шаблонов: шаблоны читаются и компилируются один раз на
+процесс, а не на каждый запрос. ``TEMPLATE_WARMUP`` компилирует их все
+при старте WSGI-приложения.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import TEMPLATES
+
+DEBUG = False
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        # С явным списком загрузчиков APP_DIRS задавать нельзя
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+TEMPLATE_WARMUP = True